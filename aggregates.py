@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+from profiling import profiled
+
+# ----------------------------------------------------------------------
+# PER-CHILD AGGREGATE COUNTERS
+# ----------------------------------------------------------------------
+# A child's aggregates look like:
+#   {"days":  {"2025-12-08": counters, ...},
+#    "weeks": {"2025-12-08": counters, ...},   # keyed by the week's Monday
+#    "total": counters}
+# where counters = {"prayed", "missed", "on_time", "kaza", "methods": {method: n}}.
+# They are built from a child's records; the weekly metrics keep only the
+# counters of finalized weeks (see rollups.py) and count the live days again.
+
+PRAYER_NAMES = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+ON_TIME_METHODS = ("Masjid", "Alone")
+
+
+def empty_counters():
+    """Returns a zeroed counter set."""
+    return {"prayed": 0, "missed": 0, "on_time": 0, "kaza": 0, "methods": {}}
+
+
+def week_start(date_str):
+    """Returns the Monday (as 'YYYY-MM-DD') of the week containing `date_str`."""
+    day = date.fromisoformat(date_str)
+    return str(day - timedelta(days=day.weekday()))
+
+
+def _adjust(counters, record, sign):
+    """Adds (sign=1) or removes (sign=-1) one record's contribution to `counters`."""
+    if not record or 'method' not in record:
+        return
+    method = record['method']
+    is_prayed = record.get('is_prayed')
+
+    if is_prayed is False and method == 'Missed':
+        counters['missed'] += sign
+    elif is_prayed is True:
+        counters['prayed'] += sign
+        if method in ON_TIME_METHODS:
+            counters['on_time'] += sign
+        elif method == 'Kaza':
+            counters['kaza'] += sign
+
+    if method is not None:
+        methods = counters['methods']
+        methods[method] = methods.get(method, 0) + sign
+        if methods[method] == 0:
+            del methods[method]
+
+
+@profiled('aggregation')
+def build_child_aggregates(child_records):
+    """Builds day, week and all-time counters from a child's {date: {prayer: record}} dict."""
+    aggregates = {"days": {}, "weeks": {}, "total": empty_counters()}
+    for date_str, daily_prayers in child_records.items():
+        day = aggregates['days'].setdefault(date_str, empty_counters())
+        week = aggregates['weeks'].setdefault(week_start(date_str), empty_counters())
+        for record in daily_prayers.values():
+            for counters in (day, week, aggregates['total']):
+                _adjust(counters, record, 1)
+    return aggregates
+
+
+def add_counters(into, counters):
+    """Adds one counter set onto another in place."""
+    for name in ('prayed', 'missed', 'on_time', 'kaza'):
+        into[name] += counters[name]
+    for method, count in counters['methods'].items():
+        into['methods'][method] = into['methods'].get(method, 0) + count
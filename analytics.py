@@ -0,0 +1,121 @@
+import pandas as pd
+
+from aggregates import PRAYER_NAMES
+from storage import get_storage
+from profiling import profiled
+
+# ----------------------------------------------------------------------
+# COLUMNAR ANALYTICS
+# ----------------------------------------------------------------------
+
+METHOD_NAMES = ["Masjid", "Alone", "Kaza", "Missed"]
+
+
+@profiled('dataframe', 'build_frame')
+def _to_frame(records_by_child, with_child_column):
+    """Flattens {child_id: {date: {prayer: record}}} into typed columns in one pass."""
+    children, dates, prayers, methods, prayed = [], [], [], [], []
+    for child_id, child_records in records_by_child.items():
+        for date_str, daily_prayers in child_records.items():
+            for prayer_name, data in daily_prayers.items():
+                if data and data.get('method') is not None:
+                    children.append(child_id)
+                    dates.append(date_str)
+                    prayers.append(prayer_name)
+                    methods.append(data['method'])
+                    prayed.append(data.get('is_prayed') is True)
+
+    extra_methods = sorted(set(methods) - set(METHOD_NAMES))
+    extra_prayers = sorted(set(prayers) - set(PRAYER_NAMES))
+    columns = {
+        'date': pd.to_datetime(pd.Series(dates, dtype='object'), format='%Y-%m-%d'),
+        'prayer': pd.Categorical(prayers, categories=PRAYER_NAMES + extra_prayers),
+        'method': pd.Categorical(methods, categories=METHOD_NAMES + extra_methods),
+        'is_prayed': pd.Series(prayed, dtype='bool'),
+    }
+    if with_child_column:
+        columns = {'child_id': pd.Categorical(children, categories=list(records_by_child)), **columns}
+    return pd.DataFrame(columns)
+
+
+def records_to_frame(child_records):
+    """
+    Converts a child's nested {date: {prayer: record}} dict into a typed
+    columnar frame in one pass: datetime64 `date`, categorical `prayer` and
+    `method`, boolean `is_prayed`. Entries without a method are skipped.
+    """
+    return _to_frame({None: child_records}, with_child_column=False)
+
+
+def household_to_frame(records_by_child):
+    """Like records_to_frame, for several children at once, with a categorical `child_id` column."""
+    return _to_frame(records_by_child, with_child_column=True)
+
+
+def load_child_frame(child_id, start=None, end=None):
+    """
+    Returns the child's records frame for the start..end window (whole
+    history if both are None), rebuilt only when their records change.
+    """
+    return get_storage().load_child_derived(child_id, 'frame', records_to_frame, start, end)
+
+
+@profiled('aggregation')
+def method_summary(frame):
+    """Counts how often each method was used, most frequent first."""
+    return frame['method'].value_counts().loc[lambda counts: counts > 0].rename('Count')
+
+
+@profiled('aggregation')
+def daily_method_counts(frame):
+    """Counts prayers per (day, method) for the stacked daily chart."""
+    grouped = frame.groupby(['date', 'method'], observed=True).size().reset_index(name='Count')
+    return grouped.rename(columns={'date': 'Date', 'method': 'Method'})
+
+
+@profiled('aggregation')
+def weekly_method_counts(frame):
+    """Counts prayers per (week, method), each week dated by its Monday, for long chart windows."""
+    week_starts = frame['date'] - pd.to_timedelta(frame['date'].dt.weekday, unit='D')
+    grouped = frame.assign(date=week_starts).groupby(['date', 'method'], observed=True).size().reset_index(name='Count')
+    return grouped.rename(columns={'date': 'Date', 'method': 'Method'})
+
+
+def load_household_frame(child_ids, start=None, end=None):
+    """Returns one frame covering every listed child's start..end window, cached per data version."""
+    return get_storage().load_household_derived(child_ids, 'household_frame', household_to_frame, start, end)
+
+
+@profiled('aggregation')
+def household_summary(frame):
+    """
+    Computes prayed/missed totals and the method mix for every child of a
+    household frame in a single grouped pass. Children without records in
+    the window get a row of zeros.
+    """
+    method_mix = frame.groupby(['child_id', 'method'], observed=False).size().unstack('method', fill_value=0)
+    prayed = frame.groupby('child_id', observed=False)['is_prayed'].sum().rename('Prayed')
+    summary = pd.concat([prayed, method_mix['Missed'], method_mix.drop(columns='Missed')], axis=1)
+    summary.columns = [str(column) for column in summary.columns]
+    return summary.astype('int64')
+
+
+def date_window(frame, start=None, end=None):
+    """Returns the rows of a records frame with start <= date <= end (either bound may be None)."""
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= frame['date'] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= frame['date'] <= pd.Timestamp(end)
+    return frame[mask]
+
+
+@profiled('aggregation')
+def weekly_completion(frame, week_start, today):
+    """
+    Returns every child's completion (%) of a household frame from
+    `week_start` (a Monday) up to `today`, out of 5 prayers per elapsed day,
+    the same figure as services.weekly_stats.
+    """
+    prayed = date_window(frame, week_start, today).groupby('child_id', observed=False)['is_prayed'].sum()
+    return prayed / (5 * ((today - week_start).days + 1)) * 100
@@ -0,0 +1,307 @@
+import re
+import json
+import asyncio
+import logging
+import argparse
+from datetime import date
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import services
+from storage import household_scope, DEFAULT_HOUSEHOLD
+from credentials import TooManyAttempts
+
+# ----------------------------------------------------------------------
+# LOCAL HTTP/JSON API
+# ----------------------------------------------------------------------
+# A small asyncio HTTP/1.1 server for kiosk tablets and apps that mark
+# prayers without a Streamlit session. Connections are handled on the
+# event loop (keep-alive, non-blocking socket I/O); the service calls,
+# which read and write storage files, run on a bounded thread pool so a
+# slow disk never stalls other clients.
+#
+#   python api_server.py --host 127.0.0.1 --port 8502
+#
+# Child endpoints accept either the child's password (X-Child-Password)
+# or the parent key (X-Parent-Key); parent endpoints need the parent key.
+# Requests act on the household named by X-Household (default: 'default').
+#
+#   GET  /health
+#   GET  /prayer-times?date=YYYY-MM-DD
+#   GET  /children                               (parent)
+#   GET  /children/<id>/day?date=YYYY-MM-DD      (child)
+#   POST /children/<id>/marks                    (child)  {"prayer", "method", "date"?}
+#   GET  /children/<id>/weekly                   (parent)
+#   GET  /children/<id>/methods?start=&end=      (parent)
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+KEEP_ALIVE_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+STATUS_TEXT = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+    405: 'Method Not Allowed', 413: 'Payload Too Large', 429: 'Too Many Requests',
+    500: 'Internal Server Error',
+}
+
+
+class ApiError(Exception):
+    """An error answered to the client as {"error": message} with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# --- REQUEST HELPERS ---
+
+def _parse_date(value, name):
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' must be a YYYY-MM-DD date")
+
+
+def _query_date(request, name):
+    values = request['query'].get(name)
+    return _parse_date(values[0] if values else None, name)
+
+
+def _json_body(request):
+    try:
+        body = json.loads(request['body'] or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Request body must be JSON')
+    if not isinstance(body, dict):
+        raise ApiError(400, 'Request body must be a JSON object')
+    return body
+
+
+def _check(authenticate, *args):
+    """Runs a services credential check, answering 429 while the identity is locked out."""
+    try:
+        return authenticate(*args)
+    except TooManyAttempts as e:
+        raise ApiError(429, str(e))
+
+
+def _require_parent(request):
+    if not _check(services.check_parent_key, request['headers'].get('x-parent-key', '')):
+        raise ApiError(401, 'A valid X-Parent-Key header is required')
+
+
+def _require_known_child(child_id):
+    if services.find_child(child_id) is None:
+        raise ApiError(404, f"Unknown child {child_id!r}")
+
+
+def _require_child(request, child_id):
+    # A child's password only matches an existing child; a parent may name any id
+    password = request['headers'].get('x-child-password')
+    if password is not None and _check(services.authenticate_child, child_id, password):
+        return
+    parent_key = request['headers'].get('x-parent-key')
+    if parent_key is not None and _check(services.check_parent_key, parent_key):
+        _require_known_child(child_id)
+        return
+    raise ApiError(401, 'A valid X-Child-Password or X-Parent-Key header is required')
+
+
+# --- ENDPOINTS ---
+# Each takes (request, *path_groups) and returns (status, payload). They
+# run on the worker pool, never on the event loop.
+
+def health(request):
+    return 200, {"status": "ok"}
+
+
+def prayer_times(request):
+    return 200, services.get_daily_prayer_times(_query_date(request, 'date'))
+
+
+def list_children(request):
+    _require_parent(request)
+    return 200, [{"name": child['name'], "id": child['id']} for child in services.list_children()]
+
+
+def day_records(request, child_id):
+    _require_child(request, child_id)
+    for_date = _query_date(request, 'date') or date.today()
+    return 200, {"date": str(for_date), "records": services.day_records(child_id, for_date)}
+
+
+def record_mark(request, child_id):
+    _require_child(request, child_id)
+    body = _json_body(request)
+    for_date = _parse_date(body.get('date'), 'date') or date.today()
+    if for_date > date.today():
+        raise ApiError(400, "'date' can't be in the future")
+    try:
+        record = services.record_prayer(child_id, body.get('prayer'), body.get('method'), for_date)
+    except ValueError as e:
+        raise ApiError(400, str(e))
+    return 201, {"date": str(for_date), "prayer": body['prayer'], "record": record}
+
+
+def weekly(request, child_id):
+    _require_parent(request)
+    _require_known_child(child_id)
+    return 200, services.weekly_stats(child_id)
+
+
+def methods(request, child_id):
+    _require_parent(request)
+    _require_known_child(child_id)
+    counts = services.method_breakdown(child_id, _query_date(request, 'start'), _query_date(request, 'end'))
+    return 200, {str(method): int(count) for method, count in counts.items()}
+
+
+ROUTES = [
+    ('GET', re.compile(r'^/health$'), health),
+    ('GET', re.compile(r'^/prayer-times$'), prayer_times),
+    ('GET', re.compile(r'^/children$'), list_children),
+    ('GET', re.compile(r'^/children/([^/]+)/day$'), day_records),
+    ('POST', re.compile(r'^/children/([^/]+)/marks$'), record_mark),
+    ('GET', re.compile(r'^/children/([^/]+)/weekly$'), weekly),
+    ('GET', re.compile(r'^/children/([^/]+)/methods$'), methods),
+]
+
+
+def dispatch(request):
+    """Routes a parsed request to its endpoint, scoped to its household. Returns (status, payload)."""
+    path_matched = False
+    for method, pattern, endpoint in ROUTES:
+        match = pattern.match(request['path'])
+        if not match:
+            continue
+        path_matched = True
+        if method == request['method']:
+            household_id = request['headers'].get('x-household') or DEFAULT_HOUSEHOLD
+            if services.find_household(household_id) is None:
+                return 404, {"error": f"Unknown household {household_id!r}"}
+            try:
+                with household_scope(household_id):
+                    return endpoint(request, *match.groups())
+            except ApiError as e:
+                return e.status, {"error": e.message}
+    if path_matched:
+        return 405, {"error": f"{request['method']} is not allowed on {request['path']}"}
+    return 404, {"error": f"No route for {request['path']}"}
+
+
+# --- HTTP SERVER ---
+
+async def _read_request(reader):
+    """Reads one request from the stream. Returns None when the client has closed the connection."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode('latin-1').split()
+    except ValueError:
+        raise ApiError(400, 'Malformed request line')
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ApiError(400, 'Too many headers')
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise ApiError(400, 'Invalid Content-Length')
+    if length > MAX_BODY_BYTES:
+        raise ApiError(413, f"Request body is limited to {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b''
+
+    url = urlsplit(target)
+    keep_alive = (headers.get('connection', '').lower() != 'close'
+                  if version == 'HTTP/1.1' else headers.get('connection', '').lower() == 'keep-alive')
+    return {
+        "method": method.upper(),
+        "path": url.path.rstrip('/') or '/',
+        "query": parse_qs(url.query),
+        "headers": headers,
+        "body": body,
+        "keep_alive": keep_alive,
+    }
+
+
+def _encode_response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+class ApiServer:
+    """Serves the JSON API on one event loop with a pool of `workers` threads for storage calls."""
+
+    def __init__(self, host='127.0.0.1', port=8502, workers=8):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEP_ALIVE_SECONDS)
+                except ApiError as e:
+                    writer.write(_encode_response(e.status, {"error": e.message}, False))
+                    break
+                if request is None:
+                    break
+
+                try:
+                    status, payload = await loop.run_in_executor(self.executor, dispatch, request)
+                except Exception:
+                    # The details stay in the server log; clients only learn that the request failed
+                    logger.exception("%s %s failed", request['method'], request['path'])
+                    status, payload = 500, {"error": "Internal server error"}
+                writer.write(_encode_response(status, payload, request['keep_alive']))
+                await writer.drain()
+                if not request['keep_alive']:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, ready=None):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=1024)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready(self)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Namaz Tracker local JSON API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--workers', type=int, default=8, help='Threads for storage calls.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    api = ApiServer(args.host, args.port, args.workers)
+    try:
+        asyncio.run(api.serve_forever(
+            ready=lambda server: print(f"Namaz Tracker API listening on http://{server.host}:{server.port}", flush=True)
+        ))
+    except KeyboardInterrupt:
+        pass
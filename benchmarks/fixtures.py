@@ -0,0 +1,81 @@
+"""
+Synthetic users.json / namaz_records.json generator for benchmarks.
+
+    python benchmarks/fixtures.py --children 1000 --years 2 --out /tmp/household
+"""
+import os
+import json
+import random
+import argparse
+from datetime import date, timedelta
+
+PRAYERS = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+METHODS = ["Masjid", "Alone", "Kaza", "Missed"]
+METHOD_WEIGHTS = [0.3, 0.4, 0.15, 0.15]
+
+
+def child_id_for(n):
+    return f"{n:08x}"
+
+
+def generate_child_records(rng, days, end_date, fill_rate=0.9):
+    """Returns one child's {date: {prayer: record}} history ending at `end_date`."""
+    child_records = {}
+    for offset in range(days, 0, -1):
+        date_str = str(end_date - timedelta(days=offset - 1))
+        daily = {}
+        for prayer in PRAYERS:
+            if rng.random() > fill_rate:
+                continue
+            method = rng.choices(METHODS, METHOD_WEIGHTS)[0]
+            is_prayed = method != 'Missed'
+            daily[prayer] = {
+                "is_prayed": is_prayed,
+                "method": method,
+                "time": f"{rng.randint(4, 22):02d}:{rng.randint(0, 59):02d}" if is_prayed else None
+            }
+        if daily:
+            child_records[date_str] = daily
+    return child_records
+
+
+def write_fixture(out_dir, children, years, seed=0, end_date=None):
+    """
+    Writes users.json and namaz_records.json for `children` children with
+    `years` of history each. Records are streamed child by child so even the
+    largest fixtures never sit in memory at once. Returns the child ids.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = int(years * 365)
+    os.makedirs(out_dir, exist_ok=True)
+
+    child_ids = [child_id_for(n) for n in range(children)]
+    users = {
+        "parent_key": "1234",
+        "children": [{"name": f"Child {n}", "id": child_id, "pass": f"pass{n}"}
+                     for n, child_id in enumerate(child_ids)]
+    }
+    with open(os.path.join(out_dir, 'users.json'), 'w') as f:
+        json.dump(users, f, indent=4)
+
+    with open(os.path.join(out_dir, 'namaz_records.json'), 'w') as f:
+        f.write('{')
+        for n, child_id in enumerate(child_ids):
+            if n:
+                f.write(',')
+            f.write(f'\n{json.dumps(child_id)}: ')
+            f.write(json.dumps(generate_child_records(rng, days, end_date)))
+        f.write('\n}\n')
+    return child_ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--children', type=int, default=100)
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+    write_fixture(args.out, args.children, args.years, args.seed)
+    print(f"Wrote {args.children} children x {args.years} years to {args.out}")
@@ -0,0 +1,153 @@
+"""
+Load test for the local JSON API: many concurrent keep-alive clients.
+
+Without --url a server is started on a synthetic household in a temp
+directory. Each client loops over a mix of requests (mostly prayer marks
+and day reads, some weekly metrics) until --duration runs out, then
+requests per second and latency percentiles are reported.
+
+    python benchmarks/load_test_api.py --clients 50 --duration 10
+    python benchmarks/load_test_api.py --url http://127.0.0.1:8502 --parent-key 1234
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixtures import write_fixture
+
+PRAYERS = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+METHODS = ["Masjid", "Alone", "Kaza", "Missed"]
+
+
+async def send(reader, writer, method, path, headers, payload=None):
+    """Sends one request on a keep-alive connection and returns (status, body)."""
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n"
+    head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(head.encode() + b'\r\n' + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def client(host, port, child_ids, parent_key, deadline, seed, latencies, errors):
+    rng = random.Random(seed)
+    headers = {"X-Parent-Key": parent_key}
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            child_id = rng.choice(child_ids)
+            roll = rng.random()
+            if roll < 0.5:
+                day = date.today() - timedelta(days=rng.randrange(30))
+                request = ('POST', f'/children/{child_id}/marks',
+                           {"prayer": rng.choice(PRAYERS), "method": rng.choice(METHODS), "date": str(day)})
+            elif roll < 0.9:
+                request = ('GET', f'/children/{child_id}/day', None)
+            else:
+                request = ('GET', f'/children/{child_id}/weekly', None)
+
+            t0 = time.perf_counter()
+            status, _ = await send(reader, writer, request[0], request[1], headers, request[2])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, child_ids, parent_key, clients, duration):
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        client(host, port, child_ids, parent_key, deadline, n, latencies, errors) for n in range(clients)
+    ))
+    return latencies, errors, time.perf_counter() - started
+
+
+def start_local_server(workdir, backend, workers):
+    env = dict(os.environ, NAMAZ_STORAGE=backend)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'api_server.py'), '--port', '0', '--workers', str(workers)],
+        cwd=workdir, env=env, stdout=subprocess.PIPE, text=True
+    )
+    url = process.stdout.readline().strip().rsplit(' ', 1)[-1]
+    return process, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='Existing server to test (default: start one on synthetic data).')
+    parser.add_argument('--parent-key', default='1234')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--children', type=int, default=20, help='Synthetic household size.')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--workers', type=int, default=8, help='Server threads for storage calls.')
+    args = parser.parse_args()
+
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.url:
+            url = args.url
+            child_ids = None
+        else:
+            child_ids = write_fixture(workdir, args.children, 1)
+            if args.backend == 'sqlite':
+                import storage
+                storage.migrate_json_to_sqlite(os.path.join(workdir, 'users.json'),
+                                               os.path.join(workdir, 'namaz_records'),
+                                               os.path.join(workdir, storage.SQLITE_DB_FILE),
+                                               os.path.join(workdir, 'namaz_records.json'))
+            process, url = start_local_server(workdir, args.backend, args.workers)
+
+        try:
+            target = urlsplit(url)
+            if child_ids is None:
+                async def fetch_children():
+                    reader, writer = await asyncio.open_connection(target.hostname, target.port)
+                    status, body = await send(reader, writer, 'GET', '/children', {"X-Parent-Key": args.parent_key})
+                    writer.close()
+                    if status != 200:
+                        sys.exit(f"GET /children failed with {status}: {body.decode()}")
+                    return [child['id'] for child in json.loads(body)]
+                child_ids = asyncio.run(fetch_children())
+
+            latencies, errors, elapsed = asyncio.run(run_load(
+                target.hostname, target.port, child_ids, args.parent_key, args.clients, args.duration))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    latencies.sort()
+    pick = lambda fraction: latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.1f}s "
+          f"-> {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency p50 {pick(0.50):.2f} ms  p95 {pick(0.95):.2f} ms  p99 {pick(0.99):.2f} ms  max {latencies[-1]:.2f} ms")
+    print(f"errors: {len(errors)}" + (f" (statuses {sorted(set(errors))})" if errors else ''))
+
+
+if __name__ == '__main__':
+    main()
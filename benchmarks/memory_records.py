@@ -0,0 +1,79 @@
+"""
+Memory benchmark: nested dict records vs the compact cached form.
+
+For each household size the records are built both ways and measured with
+tracemalloc, then the conversion costs and a day lookup are timed, and the
+compact form is checked to round-trip exactly.
+
+    python benchmarks/memory_records.py --children 10 100 --years 1 5
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compact_records import CompactRecords
+from fixtures import generate_child_records
+
+
+def traced(build):
+    """Returns (result, bytes still allocated by `build()` once it returns)."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def timed(func, repeat=5):
+    """Returns the best of `repeat` runs in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--children', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5])
+    args = parser.parse_args()
+
+    print(f"{'children':>8} {'years':>5} {'marks':>9} {'dict MiB':>9} {'compact MiB':>12} {'ratio':>6} "
+          f"{'encode ms':>10} {'decode ms':>10} {'day lookup us':>14}")
+    for children in args.children:
+        for years in args.years:
+            rng = random.Random(0)
+            days = int(years * 365)
+            # Serialized first so the dict form is measured as it comes out of json.load
+            documents = [json.dumps(generate_child_records(rng, days, date.today())) for _ in range(children)]
+
+            nested, dict_bytes = traced(lambda: [json.loads(document) for document in documents])
+            compact, compact_bytes = traced(lambda: [CompactRecords.from_nested(child) for child in nested])
+            assert all(c.to_nested() == n for c, n in zip(compact, nested)), "round trip changed the records"
+
+            marks = sum(len(daily) for child in nested for daily in child.values())
+            sample_nested, sample_compact = nested[0], compact[0]
+            lookup_date = next(iter(sample_compact), None)
+            lookups = 1000
+            lookup_us = timed(lambda: [sample_compact.get(lookup_date) for _ in range(lookups)]) * 1000 / lookups
+
+            print(f"{children:>8} {years:>5} {marks:>9} {dict_bytes / 2**20:>9.2f} {compact_bytes / 2**20:>12.2f} "
+                  f"{dict_bytes / max(compact_bytes, 1):>5.1f}x "
+                  f"{timed(lambda: CompactRecords.from_nested(sample_nested)):>10.2f} "
+                  f"{timed(sample_compact.to_nested):>10.2f} {lookup_us:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
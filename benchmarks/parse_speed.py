@@ -0,0 +1,67 @@
+"""
+Parse benchmark: stdlib json vs the storage loader's parser (orjson when
+installed), plus the schema check that runs on every loaded shard.
+
+For each history length one child's shard is serialized the way the JSON
+backend stores it, then timed through json.loads, schema.loads, schema.loads
+followed by the cleaner, and a decode into the typed PrayerRecord
+dataclasses for comparison.
+
+    python benchmarks/parse_speed.py --years 1 5 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import schema
+from fixtures import generate_child_records
+
+
+def timed(func, repeat=5):
+    """Returns the best of `repeat` runs in milliseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def typed_decode(document):
+    return {date_str: {prayer: schema.PrayerRecord.from_dict(record) for prayer, record in daily.items()}
+            for date_str, daily in schema.loads(document).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"parser: {schema.parser_name()}")
+    print(f"{'years':>5} {'marks':>7} {'KiB':>7} {'json ms':>8} {'fast ms':>8} {'speedup':>8} "
+          f"{'fast+check ms':>14} {'typed ms':>9}")
+    for years in args.years:
+        child_records = generate_child_records(random.Random(0), int(years * 365), date.today())
+        document = json.dumps(child_records, indent=4).encode('utf-8')
+        clean, problems = schema.clean_child_records(schema.loads(document))
+        assert clean == child_records and not problems, "schema rejected valid records"
+
+        marks = sum(len(daily) for daily in child_records.values())
+        stdlib_ms = timed(lambda: json.loads(document), args.repeat)
+        fast_ms = timed(lambda: schema.loads(document), args.repeat)
+        checked_ms = timed(lambda: schema.clean_child_records(schema.loads(document)), args.repeat)
+        typed_ms = timed(lambda: typed_decode(document), args.repeat)
+        print(f"{years:>5} {marks:>7} {len(document) / 1024:>7.0f} {stdlib_ms:>8.2f} {fast_ms:>8.2f} "
+              f"{stdlib_ms / fast_ms:>7.1f}x {checked_ms:>14.2f} {typed_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmarks the data paths behind the app (loading, weekly metrics, the
+daily chart and saving a mark) on synthetic households, outside Streamlit.
+
+    python benchmarks/run_benchmarks.py --children 10 100 1000 --years 1 5
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/bench-OLD.json
+
+Results (latency percentiles and peak traced memory per benchmark) are
+written as JSON to benchmarks/results/ so runs from different versions can
+be compared.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache
+import storage
+import services
+import aggregates
+from fixtures import write_fixture
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, repeat, budget):
+    """Times `func` up to `repeat` times (or until `budget` seconds pass), then traces one run's peak memory."""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat and (not timings or time.perf_counter() - started < budget):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "n": len(timings),
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": percentile(timings, 0.50),
+        "p95_ms": percentile(timings, 0.95),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1],
+        "peak_kib": peak / 1024,
+    }
+
+
+def make_backend(name, workdir):
+    if name == 'sqlite':
+        db_file = os.path.join(workdir, 'bench.db')
+        storage.migrate_json_to_sqlite(os.path.join(workdir, 'users.json'),
+                                       os.path.join(workdir, 'namaz_records'), db_file,
+                                       os.path.join(workdir, 'namaz_records.json'))
+        return storage.SqliteStorage(db_file)
+    return storage.JsonStorage(os.path.join(workdir, 'users.json'),
+                               os.path.join(workdir, 'namaz_records'),
+                               os.path.join(workdir, 'namaz_records.json'))
+
+
+def data_path_benchmarks(backend, child_ids):
+    """Returns {name: callable} for each data path, bound to one backend."""
+    cached = storage.CachedStorage(backend)
+    # The services read the default household through get_storage()
+    storage._storages[storage.DEFAULT_HOUSEHOLD] = cached
+    rng = random.Random(1)
+    today = date.today()
+    window_start = today - timedelta(days=29)
+
+    def pick_child():
+        return rng.choice(child_ids)
+
+    def weekly_metrics_cold():
+        cache.invalidate_namespace(cached.namespace)
+        services.weekly_stats(pick_child())
+
+    def weekly_metrics_warm():
+        services.weekly_stats(child_ids[0])
+
+    def mark_save():
+        method = rng.choice(["Masjid", "Alone", "Kaza", "Missed"])
+        cached.save_prayer_mark(child_ids[0], str(today), rng.choice(aggregates.PRAYER_NAMES),
+                                {"is_prayed": method != 'Missed', "method": method, "time": "12:00"})
+
+    benchmarks = {
+        'load_prayer_records': backend.load_prayer_records,
+        'load_child_records': lambda: backend.load_child_records(pick_child()),
+        'load_child_records_cached': lambda: cached.load_child_records(child_ids[0]),
+        'weekly_metrics_cold': weekly_metrics_cold,
+        'weekly_metrics_warm': weekly_metrics_warm,
+        'mark_save': mark_save,
+    }
+
+    try:
+        import analytics
+    except ImportError:
+        return benchmarks
+
+    def daily_chart_data_cold():
+        frame = analytics.records_to_frame(backend.get_records(pick_child(), window_start, today))
+        analytics.daily_method_counts(frame)
+
+    def daily_chart_data_warm():
+        analytics.daily_method_counts(cached.load_child_derived(
+            child_ids[0], 'frame', analytics.records_to_frame, window_start, today))
+
+    benchmarks['daily_chart_data_cold'] = daily_chart_data_cold
+    benchmarks['daily_chart_data_warm'] = daily_chart_data_warm
+    return benchmarks
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file) as f:
+        baseline = {
+            (r['backend'], r['children'], r['years'], r['benchmark']): r
+            for r in json.load(f)['results']
+        }
+    print(f"\nCompared with {baseline_file} (p50 ratio, >1 is slower):")
+    for r in results:
+        old = baseline.get((r['backend'], r['children'], r['years'], r['benchmark']))
+        if old and old['p50_ms'] > 0:
+            ratio = r['p50_ms'] / old['p50_ms']
+            flag = '  <-- regression' if ratio > 1.2 else ''
+            print(f"  {r['backend']:6} {r['children']:>6} ch {r['years']:>4} y  "
+                  f"{r['benchmark']:28} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--children', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--years', type=float, nargs='+', default=[1])
+    parser.add_argument('--backends', nargs='+', choices=['json', 'sqlite'], default=['json', 'sqlite'])
+    parser.add_argument('--repeat', type=int, default=50, help='Maximum timed runs per benchmark.')
+    parser.add_argument('--budget', type=float, default=5.0, help='Seconds to spend per benchmark.')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/bench-<time>.json).')
+    parser.add_argument('--compare', help='Earlier results file to compare against.')
+    args = parser.parse_args()
+
+    results = []
+    cwd = os.getcwd()
+    for children in args.children:
+        for years in args.years:
+            with tempfile.TemporaryDirectory() as workdir:
+                # The default household's files (rollups.json) are relative to the working directory
+                os.chdir(workdir)
+                t0 = time.perf_counter()
+                child_ids = write_fixture(workdir, children, years)
+                print(f"\n{children} children x {years} years "
+                      f"(fixture {time.perf_counter() - t0:.1f}s)")
+                for backend_name in args.backends:
+                    t0 = time.perf_counter()
+                    backend = make_backend(backend_name, workdir)
+                    print(f"  [{backend_name}] prepared in {time.perf_counter() - t0:.1f}s")
+                    for name, func in data_path_benchmarks(backend, child_ids).items():
+                        stats = measure(func, args.repeat, args.budget)
+                        results.append(dict(backend=backend_name, children=children, years=years,
+                                            benchmark=name, **stats))
+                        print(f"    {name:28} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+                              f"peak {stats['peak_kib']:10.1f} KiB  (n={stats['n']})")
+                    cache.invalidate()
+                os.chdir(cwd)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "version": git_version(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+            },
+            "results": results
+        }, f, indent=4)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
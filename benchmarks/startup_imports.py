@@ -0,0 +1,88 @@
+"""
+Cold-start benchmark: time to first paint for each page route.
+
+Every route is rendered in a fresh Python process (so nothing is already
+imported) on a small synthetic household, and the script reports how long
+importing Streamlit and the first rerun took, plus which heavy modules the
+route ended up loading.
+
+    python benchmarks/startup_imports.py --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixtures import write_fixture, child_id_for
+
+HEAVY_MODULES = ['numpy', 'pandas', 'plotly.express']
+
+# (label, session state before the first rerun)
+ROUTES = [
+    ('role_selection', {'page': 'role_selection'}),
+    ('parent_login', {'page': 'parent_login'}),
+    ('child_selection', {'page': 'child_selection'}),
+    ('child_password_login', {'page': 'child_password_login',
+                              'current_child_id': child_id_for(0), 'current_child_name': 'Child 0'}),
+    ('child_tracker', {'page': 'child_tracker',
+                       'current_child_id': child_id_for(0), 'current_child_name': 'Child 0'}),
+    ('parent_dashboard', {'page': 'parent_dashboard'}),
+    ('parent_dashboard (child)', {'page': 'parent_dashboard', 'parent_child_select': 'Child 0'}),
+    ('parent_manage_child', {'page': 'parent_manage_child'}),
+]
+
+# Runs in the fresh process; prints one JSON line
+PROBE = """
+import sys, json, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+for key, value in json.loads(sys.argv[2]).items():
+    at.session_state[key] = value
+at.run()
+t2 = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": (t1 - t0) * 1000,
+    "first_rerun_ms": (t2 - t1) * 1000,
+    "exception": [str(e.value) for e in at.exception],
+    "loaded": [name for name in json.loads(sys.argv[3]) if name in sys.modules],
+}))
+"""
+
+
+def probe(state, workdir):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, os.path.join(ROOT, 'main.py'), json.dumps(state), json.dumps(HEAVY_MODULES)],
+        cwd=workdir, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh processes per route.')
+    parser.add_argument('--children', type=int, default=4)
+    parser.add_argument('--years', type=float, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        write_fixture(workdir, args.children, args.years)
+        print(f"{'route':28} {'streamlit':>11} {'first rerun':>12}  heavy modules loaded")
+        for label, state in ROUTES:
+            runs = [probe(state, workdir) for _ in range(args.repeat)]
+            errors = runs[-1]['exception']
+            print(f"{label:28} {statistics.median(r['streamlit_ms'] for r in runs):8.0f} ms "
+                  f"{statistics.median(r['first_rerun_ms'] for r in runs):9.0f} ms  "
+                  f"{', '.join(runs[-1]['loaded']) or '-'}"
+                  + (f"  EXCEPTION: {errors}" if errors else ''))
+
+
+if __name__ == '__main__':
+    main()
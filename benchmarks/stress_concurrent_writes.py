@@ -0,0 +1,96 @@
+"""
+Multi-process stress test for concurrent prayer marks and profile edits.
+
+Every worker process records its own set of marks (all for one shared
+child, so they contend on the same records) and adds one child profile.
+At the end every mark and every profile must be present.
+
+    python benchmarks/stress_concurrent_writes.py --processes 8 --marks 200
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage
+
+PRAYERS = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+SHARED_CHILD = 'shared01'
+
+
+def make_backend(backend, workdir):
+    if backend == 'sqlite':
+        return storage.SqliteStorage(os.path.join(workdir, 'stress.db'))
+    return storage.JsonStorage(
+        os.path.join(workdir, 'users.json'),
+        os.path.join(workdir, 'namaz_records'),
+        os.path.join(workdir, 'namaz_records.json'),
+    )
+
+
+def mark_key(worker, n):
+    # Each worker owns a disjoint block of days
+    day = date(2020, 1, 1) + timedelta(days=worker * 1000 + n // len(PRAYERS))
+    return str(day), PRAYERS[n % len(PRAYERS)]
+
+
+def worker_main(backend, workdir, worker, marks, compact_bytes):
+    storage.LOG_COMPACT_BYTES = compact_bytes
+    store = make_backend(backend, workdir)
+    for n in range(marks):
+        date_str, prayer = mark_key(worker, n)
+        store.save_prayer_mark(SHARED_CHILD, date_str, prayer,
+                               {"is_prayed": True, "method": "Alone", "time": f"{n % 24:02d}:00"})
+        if n == marks // 2:
+            child = {"name": f"Worker {worker}", "id": f"w{worker:07d}"}
+            store.update_user_data(lambda data: data.setdefault('children', []).append(child))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--marks', type=int, default=200)
+    parser.add_argument('--compact-bytes', type=int, default=4096,
+                        help='Log size that triggers compaction (small values force contention).')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        make_backend(args.backend, workdir)
+        started = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=worker_main,
+                                    args=(args.backend, workdir, w, args.marks, args.compact_bytes))
+            for w in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - started
+
+        failed = [proc.exitcode for proc in procs if proc.exitcode != 0]
+        store = make_backend(args.backend, workdir)
+        records = store.load_prayer_records().get(SHARED_CHILD, {})
+        children = {child['id'] for child in store.load_user_data().get('children', [])}
+
+        lost_marks = [
+            (w, n) for w in range(args.processes) for n in range(args.marks)
+            if mark_key(w, n)[1] not in records.get(mark_key(w, n)[0], {})
+        ]
+        lost_children = [w for w in range(args.processes) if f"w{w:07d}" not in children]
+
+    total = args.processes * args.marks
+    print(f"{args.backend}: {total} marks from {args.processes} processes in {elapsed:.2f}s "
+          f"({total / elapsed:.0f} marks/s)")
+    print(f"Lost marks: {len(lost_marks)}  Lost profiles: {len(lost_children)}  Failed workers: {len(failed)}")
+    sys.exit(1 if lost_marks or lost_children or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
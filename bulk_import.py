@@ -0,0 +1,185 @@
+import io
+import re
+import csv
+import sys
+import json
+import argparse
+from datetime import date
+
+import services
+from storage import DEFAULT_HOUSEHOLD
+
+# ----------------------------------------------------------------------
+# BULK IMPORT OF PRAYER MARKS
+# ----------------------------------------------------------------------
+# Backfills marks (e.g. from paper logs) from CSV with a header row or from
+# JSON Lines, one mark per row:
+#
+#   child_id,date,prayer,method,time
+#   bbe8f37f,2025-11-03,Fajr,Masjid,05:10
+#
+# A `child` column holding the child's name may be used instead of
+# `child_id`; `time` is optional. The file is streamed twice: first every
+# row is validated (nothing is written if any row is bad), then the marks
+# are applied in batches, each batch with a single storage write.
+#
+#   python bulk_import.py backfill.csv --dry-run
+#   python bulk_import.py backfill.jsonl --batch-size 10000
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):[0-5]\d$')
+
+
+def detect_format(filename):
+    """Returns 'csv' or 'jsonl' from a file name's extension."""
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ValueError(f"Cannot tell the format of {filename!r}; expected .csv or .jsonl")
+
+
+def _iter_rows(stream, fmt):
+    """Yields (line_number, row) pairs; a row is a dict, or an error message for unparsable lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, 'not valid JSON'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'expected a JSON object'
+
+
+def _field(row, name):
+    """Returns a row's field stripped ('' if missing). Raises ValueError for a non-string JSON value."""
+    value = row.get(name)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f"{name} {value!r} is not a string")
+    return value.strip()
+
+
+def _parse_mark(row, child_ids, child_ids_by_name, today):
+    """Validates one row and returns its (child_id, date, prayer, record) mark."""
+    child_id = _field(row, 'child_id')
+    child_name = _field(row, 'child')
+    if not child_id and child_name:
+        child_id = child_ids_by_name.get(child_name, '')
+        if not child_id:
+            raise ValueError(f"no child named {child_name!r}")
+    if child_id not in child_ids:
+        raise ValueError(f"unknown child_id {child_id!r}" if child_id else "missing child_id (or child)")
+
+    date_str = _field(row, 'date')
+    try:
+        day = date.fromisoformat(date_str)
+    except ValueError:
+        raise ValueError(f"date {date_str!r} is not YYYY-MM-DD")
+    if day > today:
+        raise ValueError(f"date {day} is in the future")
+
+    time_str = _field(row, 'time') or None
+    if time_str is not None and not TIME_PATTERN.match(time_str):
+        raise ValueError(f"time {time_str!r} is not HH:MM")
+
+    prayer = _field(row, 'prayer')
+    record = services.make_record(prayer, _field(row, 'method'), time_str)
+    return child_id, str(day), prayer, record
+
+
+def iter_marks(stream, fmt, children):
+    """
+    Streams a CSV or JSONL file as (line_number, mark, error) triples: the
+    validated mark, or None and the reason the row was rejected.
+    """
+    child_ids = {child['id'] for child in children}
+    child_ids_by_name = {child['name']: child['id'] for child in children}
+    today = date.today()
+    for line_number, row in _iter_rows(stream, fmt):
+        if isinstance(row, str):
+            yield line_number, None, row
+            continue
+        try:
+            yield line_number, _parse_mark(row, child_ids, child_ids_by_name, today), None
+        except ValueError as e:
+            yield line_number, None, str(e)
+
+
+def import_marks(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Validates every row of a seekable text stream, then (unless any row is
+    bad, or `dry_run`) applies the marks in batches of `batch_size`. Later
+    rows win over earlier ones for the same child, date and prayer. Returns
+    {"rows", "applied", "error_count", "errors"}, listing the first
+    MAX_REPORTED_ERRORS problems as "Line N: reason".
+    """
+    children = services.list_children()
+    rows, error_count, errors = 0, 0, []
+    for line_number, _, error in iter_marks(stream, fmt, children):
+        rows += 1
+        if error:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"Line {line_number}: {error}")
+
+    result = {"rows": rows, "applied": 0, "error_count": error_count, "errors": errors}
+    if error_count or dry_run:
+        return result
+
+    stream.seek(0)
+    batch = []
+    for _, mark, _ in iter_marks(stream, fmt, children):
+        batch.append(mark)
+        if len(batch) >= batch_size:
+            services.record_marks(batch)
+            result['applied'] += len(batch)
+            batch = []
+    if batch:
+        services.record_marks(batch)
+        result['applied'] += len(batch)
+    return result
+
+
+def import_uploaded_file(uploaded, filename, dry_run=False):
+    """Imports a binary file-like object (such as a Streamlit upload) named `filename`."""
+    stream = io.TextIOWrapper(uploaded, encoding='utf-8-sig', newline='')
+    try:
+        return import_marks(stream, detect_format(filename), dry_run=dry_run)
+    finally:
+        stream.detach()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-import prayer marks from CSV or JSONL.')
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension.')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Marks per storage write.')
+    parser.add_argument('--dry-run', action='store_true', help='Only validate the file.')
+    parser.add_argument('--household', default=DEFAULT_HOUSEHOLD, help='Household id.')
+    args = parser.parse_args()
+
+    if services.find_household(args.household) is None:
+        sys.exit(f"Unknown household: {args.household}")
+    services.use_household(args.household)
+    with open(args.file, encoding='utf-8-sig', newline='') as f:
+        result = import_marks(f, args.format or detect_format(args.file), args.batch_size, args.dry_run)
+
+    for error in result['errors']:
+        print(error, file=sys.stderr)
+    if result['error_count']:
+        sys.exit(f"{result['error_count']} of {result['rows']} rows are invalid; nothing was imported.")
+    if args.dry_run:
+        print(f"{result['rows']} rows are valid.")
+    else:
+        print(f"Imported {result['applied']} prayer marks.")
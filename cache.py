@@ -0,0 +1,122 @@
+import os
+import threading
+
+from profiling import span
+
+# ----------------------------------------------------------------------
+# PROCESS-WIDE READ CACHE
+# ----------------------------------------------------------------------
+# Streamlit re-executes main.py on every interaction but keeps imported
+# modules alive, so this module-level store is shared by every rerun and
+# every session of the server process.
+#
+# Key groups are strings of the form 'namespace:name[:...]'; each storage
+# (one per household) uses its own namespace, so it can drop all of its
+# entries without touching anyone else's.
+
+_lock = threading.Lock()
+_entries = {}  # key -> (signature, version, value)
+_versions = {}  # key group -> write counter, bumped by invalidate()
+_namespace_epochs = {}  # namespace -> counter, bumped by invalidate_namespace()
+_epoch = 0  # bumped when everything is invalidated at once
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def file_signature(*paths):
+    """Returns a (mtime_ns, size) tuple per path so external edits change the signature."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _group(key):
+    return key[0] if isinstance(key, tuple) else key
+
+
+def _namespace(group):
+    return group.split(':', 1)[0] if isinstance(group, str) else group
+
+
+def _version(group):
+    return (_epoch, _namespace_epochs.get(_namespace(group), 0), _versions.get(group, 0))
+
+
+def get_or_load(key, signature, loader):
+    """
+    Returns the cached value for `key` if both its signature and the write
+    version of its group are unchanged; otherwise calls `loader()` and caches it.
+    Cached values are shared, so callers must treat them as read-only.
+    """
+    group = _group(key)
+    with _lock:
+        version = _version(group)
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == signature and entry[1] == version:
+            _stats['hits'] += 1
+            return entry[2]
+        _stats['misses'] += 1
+
+    with span('cache_miss', 'io'):
+        value = loader()
+
+    with _lock:
+        # Only store if no write happened while we were loading
+        if _version(group) == version:
+            _entries[key] = (signature, version, value)
+    return value
+
+
+def peek(key):
+    """Returns (signature, value) of the current entry for `key`, or None, without counting a hit."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[1] == _version(_group(key)):
+            return entry[0], entry[2]
+        return None
+
+
+def put(key, signature, value):
+    """Stores a value computed by the caller (e.g. updated in place of a reload)."""
+    with _lock:
+        _entries[key] = (signature, _version(_group(key)), value)
+
+
+def invalidate(group=None):
+    """Drops cached entries of a key group (or everything) after a write."""
+    global _epoch
+    with _lock:
+        _stats['invalidations'] += 1
+        if group is None:
+            _epoch += 1
+            _entries.clear()
+            return
+        _versions[group] = _versions.get(group, 0) + 1
+        for key in [k for k in _entries if _group(k) == group]:
+            del _entries[key]
+
+
+def invalidate_namespace(namespace):
+    """Drops every cached entry whose key group belongs to `namespace`."""
+    with _lock:
+        _stats['invalidations'] += 1
+        _namespace_epochs[namespace] = _namespace_epochs.get(namespace, 0) + 1
+        for key in [k for k in _entries if _namespace(_group(k)) == namespace]:
+            del _entries[key]
+
+
+def get_cache_stats():
+    """Returns hit/miss/invalidation counters and the number of cached entries."""
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def reset_cache_stats():
+    """Zeroes the hit/miss/invalidation counters."""
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
@@ -0,0 +1,69 @@
+import pandas as pd
+import plotly.express as px
+
+import analytics
+from storage import get_storage
+from profiling import profiled
+
+# ----------------------------------------------------------------------
+# MEMOIZED PLOTLY FIGURES
+# ----------------------------------------------------------------------
+# Building a px figure costs far more than drawing it, so figures are cached
+# like any other derived view: per child, date window and data version (see
+# CachedStorage.load_child_derived). Reruns that don't change the child's
+# records (sidebar clicks, navigation) reuse the same figure object.
+# Cached figures are shared and must not be modified by callers.
+#
+# Windows longer than DAILY_BINS_MAX_DAYS are binned by week, so the chart
+# sends at most a few hundred bars to the browser however long the range is.
+
+DAILY_BINS_MAX_DAYS = 90
+
+
+def is_weekly_window(start, end):
+    """Returns True if a start..end chart is binned by week rather than by day."""
+    return (end - start).days + 1 > DAILY_BINS_MAX_DAYS
+
+
+@profiled('plotly')
+def build_daily_method_figure(child_records, start, end):
+    """
+    Returns the stacked method-per-day bar chart for one child's start..end
+    records (per week for long windows), or None if nothing was recorded.
+    """
+    frame = analytics.records_to_frame(child_records)
+    weekly = is_weekly_window(start, end)
+    counts = analytics.weekly_method_counts(frame) if weekly else analytics.daily_method_counts(frame)
+    if counts.empty:
+        return None
+
+    fig = px.bar(
+        counts,
+        x='Date',
+        y='Count',
+        color='Method',
+        title='Total Methods Used Per Week' if weekly else 'Total Methods Used Per Day',
+        labels={'Count': 'Number of Prayers', 'Date': 'Week of' if weekly else 'Day'},
+        category_orders={"Method": analytics.METHOD_NAMES},
+        height=400
+    )
+
+    # One tick per day for short windows; let Plotly space ticks for longer ones
+    if (end - start).days <= 31:
+        fig.update_xaxes(dtick="D1")
+    padding = pd.Timedelta(days=3, hours=12) if weekly else pd.Timedelta(hours=12)
+    first = pd.Timestamp(start)
+    if weekly:
+        first -= pd.Timedelta(days=first.weekday())
+    fig.update_xaxes(tickformat="%b %d", range=[first - padding, pd.Timestamp(end) + padding])
+    fig.update_layout(barmode='stack', legend_title_text='Method')
+    return fig
+
+
+def daily_method_figure(child_id, start, end):
+    """Returns the child's cached method chart for start..end (see build_daily_method_figure)."""
+    return get_storage().load_child_derived(
+        child_id, 'daily_method_figure',
+        lambda child_records: build_daily_method_figure(child_records, start, end),
+        start, end
+    )
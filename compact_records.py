@@ -0,0 +1,207 @@
+import re
+import bisect
+from array import array
+from collections.abc import Mapping
+from datetime import date
+
+from aggregates import PRAYER_NAMES
+
+# ----------------------------------------------------------------------
+# COMPACT IN-MEMORY RECORDS
+# ----------------------------------------------------------------------
+# A child's {date: {prayer: record}} history held as a handful of typed
+# arrays instead of thousands of small dicts:
+#
+#   day_ordinals  array('i')  sorted date.toordinal() of every recorded day
+#   day_offsets   array('i')  day k's entries are day_offsets[k]:day_offsets[k + 1]
+#   prayers       array('b')  index into PRAYER_NAMES
+#   methods       array('b')  index into METHOD_CODES, -1 for None
+#   prayed        array('b')  1 / 0, -1 for None
+#   minutes       array('h')  'HH:MM' as minutes since midnight, -1 for None
+#
+# CompactRecords is a read-only Mapping with the same shape as the nested
+# dict (days are built on access), so callers don't need to know which
+# form they got. Anything that doesn't fit the codes exactly (unknown
+# prayer or method names, odd time strings, extra fields) is kept verbatim
+# per entry, so to_nested() always returns exactly what was encoded.
+
+METHOD_CODES = ["Masjid", "Alone", "Kaza", "Missed"]
+RECORD_FIELDS = ('is_prayed', 'method', 'time')
+
+_PRAYER_INDEX = {name: n for n, name in enumerate(PRAYER_NAMES)}
+_METHOD_INDEX = {name: n for n, name in enumerate(METHOD_CODES)}
+_PRAYED_CODES = {True: 1, False: 0, None: -1}
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_TIME = re.compile(r'^([01]\d|2[0-3]):([0-5]\d)$')
+
+
+def is_date_key(value):
+    """Returns True for a valid 'YYYY-MM-DD' date string, the only key form that can be encoded."""
+    if not isinstance(value, str) or not _ISO_DATE.match(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _encode_entry(prayer, record):
+    """Returns (prayer, method, prayed, minutes) codes, or None if the entry has to be kept verbatim."""
+    if prayer not in _PRAYER_INDEX or not isinstance(record, dict) or len(record) != 3:
+        return None
+    try:
+        is_prayed, method, time_str = (record[field] for field in RECORD_FIELDS)
+    except KeyError:
+        return None
+    if is_prayed not in (True, False, None) or type(is_prayed) not in (bool, type(None)):
+        return None
+    if method is not None and (not isinstance(method, str) or method not in _METHOD_INDEX):
+        return None
+    if time_str is None:
+        minutes = -1
+    else:
+        match = _TIME.match(time_str) if isinstance(time_str, str) else None
+        if match is None:
+            return None
+        minutes = int(match.group(1)) * 60 + int(match.group(2))
+    return (_PRAYER_INDEX[prayer], -1 if method is None else _METHOD_INDEX[method],
+            _PRAYED_CODES[is_prayed], minutes)
+
+
+class CompactRecords(Mapping):
+    """One child's records in typed columns; behaves like a read-only {date: {prayer: record}} dict."""
+
+    __slots__ = ('day_ordinals', 'day_offsets', 'prayers', 'methods', 'prayed', 'minutes', 'verbatim')
+
+    def __init__(self):
+        self.day_ordinals = array('i')
+        self.day_offsets = array('i', [0])
+        self.prayers = array('b')
+        self.methods = array('b')
+        self.prayed = array('b')
+        self.minutes = array('h')
+        self.verbatim = {}  # entry index -> (prayer, record) for entries that don't fit the codes
+
+    # --- Conversion ---
+
+    @classmethod
+    def from_nested(cls, child_records):
+        """Encodes a {date: {prayer: record}} dict. Every date must be 'YYYY-MM-DD'."""
+        compact = cls()
+        for date_str in sorted(child_records):
+            compact.day_ordinals.append(date.fromisoformat(date_str).toordinal())
+            for prayer, record in child_records[date_str].items():
+                compact._append_entry(prayer, record)
+            compact.day_offsets.append(len(compact.prayers))
+        return compact
+
+    def to_nested(self):
+        """Decodes back into the plain {date: {prayer: record}} dict used on disk."""
+        return {date_str: self[date_str] for date_str in self}
+
+    def _append_entry(self, prayer, record):
+        codes = _encode_entry(prayer, record)
+        if codes is None:
+            self.verbatim[len(self.prayers)] = (prayer, dict(record) if isinstance(record, dict) else record)
+            codes = (0, -1, -1, -1)
+        for column, code in zip((self.prayers, self.methods, self.prayed, self.minutes), codes):
+            column.append(code)
+
+    def _entry(self, index):
+        """Returns (prayer, record) for one entry."""
+        if index in self.verbatim:
+            prayer, record = self.verbatim[index]
+            return prayer, dict(record) if isinstance(record, dict) else record
+        method, prayed, minutes = self.methods[index], self.prayed[index], self.minutes[index]
+        return PRAYER_NAMES[self.prayers[index]], {
+            "is_prayed": None if prayed < 0 else bool(prayed),
+            "method": None if method < 0 else METHOD_CODES[method],
+            "time": None if minutes < 0 else f"{minutes // 60:02d}:{minutes % 60:02d}",
+        }
+
+    def _day_index(self, date_str):
+        """Returns the position of a date in day_ordinals, or -1 if it isn't recorded."""
+        if not is_date_key(date_str):
+            return -1
+        ordinal = date.fromisoformat(date_str).toordinal()
+        k = bisect.bisect_left(self.day_ordinals, ordinal)
+        return k if k < len(self.day_ordinals) and self.day_ordinals[k] == ordinal else -1
+
+    # --- Mapping interface ---
+
+    def __getitem__(self, date_str):
+        k = self._day_index(date_str)
+        if k < 0:
+            raise KeyError(date_str)
+        return dict(self._entry(i) for i in range(self.day_offsets[k], self.day_offsets[k + 1]))
+
+    def __contains__(self, date_str):
+        return self._day_index(date_str) >= 0
+
+    def __iter__(self):
+        for ordinal in self.day_ordinals:
+            yield date.fromordinal(ordinal).isoformat()
+
+    def __len__(self):
+        return len(self.day_ordinals)
+
+    def __repr__(self):
+        return f"<CompactRecords {len(self)} days, {len(self.prayers)} marks>"
+
+    # --- Updates (only on a private copy, never on a shared instance) ---
+
+    def copy(self):
+        """Returns an independent copy; array copies are flat memory copies."""
+        clone = CompactRecords.__new__(CompactRecords)
+        for name in ('day_ordinals', 'day_offsets', 'prayers', 'methods', 'prayed', 'minutes'):
+            setattr(clone, name, array(getattr(self, name).typecode, getattr(self, name)))
+        clone.verbatim = dict(self.verbatim)
+        return clone
+
+    def set_record(self, date_str, prayer, record):
+        """Stores (or overwrites) one prayer's record in place, keeping dict semantics for prayer order."""
+        ordinal = date.fromisoformat(date_str).toordinal()
+        k = bisect.bisect_left(self.day_ordinals, ordinal)
+        if k == len(self.day_ordinals) or self.day_ordinals[k] != ordinal:
+            self.day_ordinals.insert(k, ordinal)
+            self.day_offsets.insert(k, self.day_offsets[k])
+
+        start, end = self.day_offsets[k], self.day_offsets[k + 1]
+        for index in range(start, end):
+            if self._entry(index)[0] == prayer:
+                self.verbatim.pop(index, None)
+                self._write_entry(index, prayer, record)
+                return
+
+        # New prayer for this day: open a slot at the end of the day's entries
+        for column, blank in ((self.prayers, 0), (self.methods, -1), (self.prayed, -1), (self.minutes, -1)):
+            column.insert(end, blank)
+        for n in range(k + 1, len(self.day_offsets)):
+            self.day_offsets[n] += 1
+        if self.verbatim:
+            self.verbatim = {(i + 1 if i >= end else i): entry for i, entry in self.verbatim.items()}
+        self._write_entry(end, prayer, record)
+
+    def _write_entry(self, index, prayer, record):
+        codes = _encode_entry(prayer, record)
+        if codes is None:
+            self.verbatim[index] = (prayer, dict(record) if isinstance(record, dict) else record)
+            codes = (0, -1, -1, -1)
+        for column, code in zip((self.prayers, self.methods, self.prayed, self.minutes), codes):
+            column[index] = code
+
+
+def encode(child_records):
+    """
+    Returns the compact form of a child's records, or the dict itself when
+    it can't be encoded (a date key that isn't 'YYYY-MM-DD').
+    """
+    if isinstance(child_records, CompactRecords):
+        return child_records
+    if not all(is_date_key(date_str) for date_str in child_records):
+        return child_records
+    try:
+        return CompactRecords.from_nested(child_records)
+    except (ValueError, AttributeError):
+        return child_records
@@ -0,0 +1,159 @@
+import os
+import hmac
+import math
+import time
+import hashlib
+import threading
+from functools import lru_cache
+
+# ----------------------------------------------------------------------
+# HASHED CREDENTIALS AND LOGIN THROTTLING
+# ----------------------------------------------------------------------
+# Passwords and the parent key are stored as salted PBKDF2-SHA256 hashes:
+#
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+#
+# Deriving a key is deliberately slow (~0.25 s), so a secret that has
+# already been verified once is remembered as a keyed digest and later
+# checks of the same secret are instant. Wrong guesses always pay the full
+# cost, and LoginThrottle locks an identity out after repeated failures,
+# with the lockout doubling each time: guessing a 4-digit key online takes
+# days instead of seconds. (With a copy of the stored hash the keyspace is
+# too small for hashing alone to protect it; the throttle guards the app.)
+
+HASH_SCHEME = 'pbkdf2_sha256'
+PBKDF2_ITERATIONS = 600_000
+SALT_BYTES = 16
+
+MAX_FAILURES = 5
+LOCKOUT_SECONDS = 30
+MAX_LOCKOUT_SECONDS = 60 * 60
+FAILURE_WINDOW_SECONDS = 60 * 60  # failures older than this are forgotten
+MAX_TRACKED_IDENTITIES = 10_000
+
+# Per-process key for remembering verified secrets; never stored anywhere
+_VERIFIED_KEY = os.urandom(32)
+_verified = {}  # stored hash -> HMAC of the secret that matched it
+_verified_lock = threading.Lock()
+
+
+def _derive(secret, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), salt, iterations)
+
+
+def hash_secret(secret, iterations=PBKDF2_ITERATIONS):
+    """Returns the salted, encoded hash of a password or key, ready to store."""
+    salt = os.urandom(SALT_BYTES)
+    return f"{HASH_SCHEME}${iterations}${salt.hex()}${_derive(secret, salt, iterations).hex()}"
+
+
+@lru_cache(maxsize=4096)
+def _parse(stored):
+    """Returns (iterations, salt, digest) of an encoded hash, or None if it isn't one."""
+    try:
+        scheme, iterations, salt, digest = stored.split('$')
+        if scheme != HASH_SCHEME:
+            return None
+        return int(iterations), bytes.fromhex(salt), bytes.fromhex(digest)
+    except (AttributeError, ValueError):
+        return None
+
+
+def is_hashed(stored):
+    """Returns True if a stored credential is an encoded hash rather than plaintext."""
+    return _parse(stored) is not None
+
+
+def _fingerprint(secret):
+    return hmac.new(_VERIFIED_KEY, secret.encode('utf-8'), hashlib.sha256).digest()
+
+
+def verify_secret(secret, stored):
+    """Returns True if `secret` matches an encoded hash, in constant time."""
+    params = _parse(stored)
+    if params is None or not isinstance(secret, str):
+        return False
+    remembered = _verified.get(stored)
+    if remembered is not None and hmac.compare_digest(remembered, _fingerprint(secret)):
+        return True
+
+    iterations, salt, digest = params
+    if not hmac.compare_digest(_derive(secret, salt, iterations), digest):
+        return False
+    remember_verified(secret, stored)
+    return True
+
+
+def remember_verified(secret, stored):
+    """Lets later checks of `secret` against `stored` skip the key derivation (e.g. right after hashing it)."""
+    with _verified_lock:
+        if len(_verified) >= MAX_TRACKED_IDENTITIES:
+            _verified.clear()
+        _verified[stored] = _fingerprint(secret)
+
+
+def plaintext_matches(secret, plaintext):
+    """Compares a secret with a legacy plaintext credential in constant time."""
+    if not isinstance(secret, str) or not isinstance(plaintext, str) or not plaintext:
+        return False
+    return hmac.compare_digest(secret.encode('utf-8'), plaintext.encode('utf-8'))
+
+# ----------------------------------------------------------------------
+# ATTEMPT THROTTLING
+# ----------------------------------------------------------------------
+
+class TooManyAttempts(Exception):
+    """Raised while an identity is locked out; `retry_after` is in whole seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed attempts. Please try again in {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class LoginThrottle:
+    """
+    Counts failed logins per identity (e.g. 'household:parent') in memory.
+    After MAX_FAILURES failures the identity is locked for LOCKOUT_SECONDS,
+    doubling with every further failure up to MAX_LOCKOUT_SECONDS.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._failures = {}  # identity -> (count, last failure, locked until)
+
+    def check(self, identity):
+        """Raises TooManyAttempts if the identity is locked out right now."""
+        with self._lock:
+            entry = self._failures.get(identity)
+        if entry is not None and entry[2] > self.clock():
+            raise TooManyAttempts(math.ceil(entry[2] - self.clock()))
+
+    def failure(self, identity):
+        """Records a failed attempt, locking the identity out once it has failed too often."""
+        now = self.clock()
+        with self._lock:
+            count, last, _ = self._failures.get(identity, (0, now, 0))
+            if now - last > FAILURE_WINDOW_SECONDS:
+                count = 0
+            count += 1
+            locked_until = 0
+            if count >= MAX_FAILURES:
+                locked_until = now + min(LOCKOUT_SECONDS * 2 ** (count - MAX_FAILURES), MAX_LOCKOUT_SECONDS)
+            self._failures[identity] = (count, now, locked_until)
+            if len(self._failures) > MAX_TRACKED_IDENTITIES:
+                self._prune(now)
+
+    def success(self, identity):
+        """Forgets an identity's failures after a successful login."""
+        with self._lock:
+            self._failures.pop(identity, None)
+
+    def _prune(self, now):
+        # Caller holds the lock
+        for identity, (_, last, locked_until) in list(self._failures.items()):
+            if locked_until <= now and now - last > FAILURE_WINDOW_SECONDS:
+                del self._failures[identity]
+
+
+login_throttle = LoginThrottle()
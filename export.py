@@ -0,0 +1,168 @@
+import io
+import csv
+import importlib.util
+import sys
+import argparse
+from datetime import date
+
+from storage import get_storage, DEFAULT_HOUSEHOLD
+from aggregates import PRAYER_NAMES
+import services
+
+# ----------------------------------------------------------------------
+# STREAMING EXPORT (CSV / PARQUET)
+# ----------------------------------------------------------------------
+# Records are flattened one child at a time into rows of EXPORT_COLUMNS and
+# pushed through generators straight into the writer, so memory is bounded
+# by one child's date window (or one Parquet row group), not the household.
+# Parquet needs the optional pyarrow package.
+#
+#   python export.py --format csv --out records.csv
+#   python export.py --format parquet --out records.parquet --child bbe8f37f --start 2025-01-01
+
+EXPORT_COLUMNS = ['child_id', 'child_name', 'date', 'prayer', 'is_prayed', 'method', 'time']
+PARQUET_ROW_GROUP = 50_000
+
+_PRAYER_ORDER = {name: n for n, name in enumerate(PRAYER_NAMES)}
+
+
+def parquet_available():
+    """Returns True if pyarrow is installed, i.e. Parquet export is offered."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def iter_export_rows(children, start=None, end=None, household_id=None):
+    """
+    Yields one flat row per recorded prayer, child by child, ordered by date
+    and prayer, for the start..end window of each child in `children`, from
+    the given household (default: the current one).
+    """
+    # Read straight from the backend so a big export doesn't fill the shared cache
+    backend = get_storage(household_id).backend
+    for child in children:
+        child_records = backend.get_records(child['id'], start, end)
+        for date_str in sorted(child_records):
+            daily = child_records[date_str]
+            for prayer in sorted(daily, key=lambda name: _PRAYER_ORDER.get(name, len(_PRAYER_ORDER))):
+                record = daily[prayer] or {}
+                yield {
+                    "child_id": child['id'],
+                    "child_name": child.get('name'),
+                    "date": date_str,
+                    "prayer": prayer,
+                    "is_prayed": record.get('is_prayed'),
+                    "method": record.get('method'),
+                    "time": record.get('time'),
+                }
+
+
+def write_csv(rows, out):
+    """Streams rows into a text file object as CSV with a header. Returns the row count."""
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS, lineterminator='\n')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_parquet(rows, out, row_group=PARQUET_ROW_GROUP):
+    """
+    Streams rows into a Parquet file (path or binary file object), one row
+    group of `row_group` rows at a time. Returns the row count.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = pa.schema([
+        ('child_id', pa.dictionary(pa.int32(), pa.string())),
+        ('child_name', pa.dictionary(pa.int32(), pa.string())),
+        ('date', pa.date32()),
+        ('prayer', pa.dictionary(pa.int8(), pa.string())),
+        ('is_prayed', pa.bool_()),
+        ('method', pa.dictionary(pa.int8(), pa.string())),
+        ('time', pa.string()),
+    ])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for batch in _batches(rows, row_group):
+            columns = {name: [row[name] for row in batch] for name in EXPORT_COLUMNS}
+            columns['date'] = [date.fromisoformat(value) for value in columns['date']]
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_file(children, fmt, start=None, end=None, household_id=None):
+    """
+    Writes an export into an in-memory buffer and returns it rewound, ready
+    to be served by st.download_button (which reads the whole download into
+    memory anyway). Big exports belong on the command line, which streams
+    to a file.
+    """
+    buffer = io.BytesIO()
+    rows = iter_export_rows(children, start, end, household_id)
+    if fmt == 'parquet':
+        write_parquet(rows, buffer)
+    else:
+        text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+        write_csv(rows, text)
+        text.flush()
+        text.detach()
+    buffer.seek(0)
+    return buffer
+
+
+def export_filename(children, fmt, start=None, end=None):
+    """Returns a descriptive download name such as 'namaz-umar-2025-01-01-to-2025-01-31.csv'."""
+    who = children[0]['name'] if len(children) == 1 else 'household'
+    window = f"-{start}-to-{end}" if start and end else ''
+    return f"namaz-{who.lower().replace(' ', '-')}{window}.{fmt}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export prayer records as flat CSV or Parquet.')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--out', help='Output file (default: stdout for CSV).')
+    parser.add_argument('--child', action='append', help='Child id to export (repeatable; default: all).')
+    parser.add_argument('--start', type=date.fromisoformat, help='First date (YYYY-MM-DD).')
+    parser.add_argument('--end', type=date.fromisoformat, help='Last date (YYYY-MM-DD).')
+    parser.add_argument('--household', default=DEFAULT_HOUSEHOLD, help='Household id.')
+    args = parser.parse_args()
+
+    if services.find_household(args.household) is None:
+        sys.exit(f"Unknown household: {args.household}")
+    services.use_household(args.household)
+    children = services.list_children()
+    if args.child:
+        unknown = set(args.child) - {child['id'] for child in children}
+        if unknown:
+            sys.exit(f"Unknown child id(s): {', '.join(sorted(unknown))}")
+        children = [child for child in children if child['id'] in args.child]
+
+    rows = iter_export_rows(children, args.start, args.end)
+    if args.format == 'parquet':
+        if not args.out:
+            sys.exit("--out is required for Parquet exports")
+        count = write_parquet(rows, args.out)
+    elif args.out:
+        with open(args.out, 'w', newline='', encoding='utf-8') as f:
+            count = write_csv(rows, f)
+    else:
+        count = write_csv(rows, sys.stdout)
+    print(f"Exported {count} prayer records.", file=sys.stderr)
@@ -0,0 +1,69 @@
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Suffix of the last-known-good copy kept by atomic_write_json(..., backup=True)
+BACKUP_SUFFIX = '.bak'
+
+# ----------------------------------------------------------------------
+# CROSS-PROCESS FILE LOCKS AND ATOMIC WRITES
+# ----------------------------------------------------------------------
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Holds an OS-level lock on `path + '.lock'` for the duration of the block.
+    Shared locks let readers overlap on POSIX; on Windows every lock is exclusive.
+    """
+    lock_path = path + '.lock'
+    with open(lock_path, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_json(path, data, backup=False):
+    """
+    Writes `data` to a temp file next to `path` and swaps it in with
+    os.replace, so readers see either the old or the new document, never a
+    truncated one. With `backup` the same document is also written to
+    `path + BACKUP_SUFFIX`, a known-good copy to restore if `path` is ever
+    damaged.
+    """
+    text = json.dumps(data, indent=4)
+    _atomic_write_text(path, text)
+    if backup:
+        _atomic_write_text(path + BACKUP_SUFFIX, text)
+
+
+def _atomic_write_text(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
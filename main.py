@@ -1,103 +1,73 @@
-import streamlit as st
-import json
 import os
-import uuid
-from datetime import date
-import time
-import pandas as pd
-
-# --- FILE CONFIGURATION ---
-USER_FILE = 'users.json'
-PRAYER_RECORDS_FILE = 'namaz_records.json'
+import streamlit as st
+from datetime import date, timedelta
+from cache import get_cache_stats
+import profiling
+from profiling import profiled, span
+import services
+from storage import DEFAULT_HOUSEHOLD
+from credentials import TooManyAttempts
+from services import PRAYER_NAMES
+
+# Runs the nightly day finalization on a thread of the app process (see scheduler.py)
+SCHEDULER_ENABLED = os.environ.get('NAMAZ_SCHEDULER') == '1'
+# Sends reminders for unmarked prayers from a thread of the app process (see reminders.py)
+REMINDERS_ENABLED = os.environ.get('NAMAZ_REMINDERS') == '1'
 
 # --- SESSION STATE INITIALIZATION ---
-if 'role' not in st.session_state:
-    st.session_state.role = None
-if 'page' not in st.session_state:
-    st.session_state.page = 'role_selection'
-if 'current_child_id' not in st.session_state:
-    st.session_state.current_child_id = None
-if 'current_child_name' not in st.session_state:
-    st.session_state.current_child_name = None
-if 'last_prayer_selected' not in st.session_state:
-    st.session_state.last_prayer_selected = None
 
-# --- FILE HANDLING FUNCTIONS ---
-
-def load_user_data():
-    """Loads user data (key and children) from the JSON file."""
-    if os.path.exists(USER_FILE):
-        try:
-            with open(USER_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            # Handle empty or corrupted file by returning an empty dict
-            return {} 
-    return {}
-
-def save_user_data(data):
-    """Saves user data to the JSON file."""
-    with open(USER_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
-
-def load_prayer_records():
-    """Loads prayer records from the JSON file."""
-    if os.path.exists(PRAYER_RECORDS_FILE):
-        try:
-            with open(PRAYER_RECORDS_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            # Handle empty or corrupted file by returning an empty dict
-            return {}
-    return {}
-
-def save_prayer_records(records):
-    """Saves prayer records to the JSON file."""
-    with open(PRAYER_RECORDS_FILE, 'w') as f:
-        json.dump(records, f, indent=4)
+def init_session_state():
+    """Sets the session's navigation defaults on its first run."""
+    if 'role' not in st.session_state:
+        st.session_state.role = None
+    if 'page' not in st.session_state:
+        st.session_state.page = 'role_selection'
+    if 'current_child_id' not in st.session_state:
+        st.session_state.current_child_id = None
+    if 'current_child_name' not in st.session_state:
+        st.session_state.current_child_name = None
+    if 'last_prayer_selected' not in st.session_state:
+        st.session_state.last_prayer_selected = None
+    if 'household_id' not in st.session_state:
+        st.session_state.household_id = DEFAULT_HOUSEHOLD
 
 # --- UTILITY/NAVIGATION FUNCTIONS ---
 
-def get_daily_prayer_times():
-    """Returns dummy prayer times for the current date."""
-    # Note: Times are dummy data, replace with API integration in final app
-    return {
-        "date": str(date.today()),
-        "Fajr": "05:45 AM",
-        "Dhuhr": "12:35 PM",
-        "Asr": "03:45 PM",
-        "Maghrib": "05:15 PM",
-        "Isha": "07:00 PM"
-    }
-
 def set_role(selected_role):
     """Function to update the role and switch the page."""
     st.session_state.role = selected_role
     
-    user_data = load_user_data()
-    children_list = user_data.get('children', [])
-    
     # --- UPDATED PARENT FLOW ---
     if selected_role == 'parent':
-        if 'parent_key' in user_data and user_data['parent_key']:
+        if services.has_parent_key():
             st.session_state.page = 'parent_login'
         else:
             st.session_state.page = 'parent_setup'
     # --- CHILD FLOW ---        
     elif selected_role == 'child':
-        if children_list:
+        if services.list_children():
             st.session_state.page = 'child_selection' 
         else:
             st.session_state.page = 'child_not_registered' 
     
     st.rerun()
 
+def switch_household(household_id):
+    """Moves the session to another household and back to role selection."""
+    st.session_state.household_id = household_id
+    st.session_state.role = None
+    st.session_state.current_child_id = None
+    st.session_state.current_child_name = None
+    st.session_state.page = 'role_selection'
+    st.rerun()
+
 # ----------------------------------------------------------------------
 # CHILD RENDER FUNCTIONS
 # ----------------------------------------------------------------------
 
         
 
+@profiled('render')
 def render_child_tracker_page():
     
     child_id = st.session_state.current_child_id
@@ -110,7 +80,7 @@ def render_child_tracker_page():
 
     selected_option = st.sidebar.radio(
         "Select an Action:",
-        ('Prayer Timings', 'Mark a Prayer'),
+        ('Prayer Timings', 'Mark a Prayer', 'Mark Whole Day'),
         key='sidebar_nav'
     )
 
@@ -131,15 +101,20 @@ def render_child_tracker_page():
     
     elif selected_option == 'Mark a Prayer':
         render_mark_prayer(child_id)
+    
+    elif selected_option == 'Mark Whole Day':
+        render_mark_whole_day(child_id)
 
 
+@profiled('render')
 def render_prayer_timings(child_id):
     """Displays today's prayer timings in a clean format."""
     st.header("Today's Prayer Schedule 🗓️")
-    prayer_times = get_daily_prayer_times()
+    prayer_times = services.get_daily_prayer_times()
     today = prayer_times['date']
     
-    records = load_prayer_records().get(child_id, {}).get(today, {})
+    records = services.day_records(child_id, today)
+    overdue = services.overdue_prayers(child_id)
 
     # Create the column headers
     col_names = st.columns(3)
@@ -155,6 +130,9 @@ def render_prayer_timings(child_id):
         
         status_text = "⏳ Pending"
         color = "gray"
+        if name in overdue:
+            status_text = "⏰ Overdue – please mark it"
+            color = "violet"
         
         if status_data:
             is_prayed = status_data.get('is_prayed')
@@ -180,20 +158,17 @@ def render_prayer_timings(child_id):
             
             
 
+@profiled('render')
 def render_mark_prayer(child_id):
     """Allows the child to log a prayer status with separated data fields."""
     st.header("Record Your Prayer 🙏")
     
-    today = str(date.today())
-    all_records = load_prayer_records()
-    child_records = all_records.get(child_id, {})
-    daily_records = child_records.get(today, {})
+    daily_records = services.day_records(child_id)
     
     # 1. Select the Prayer
-    prayer_names = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
     selected_prayer = st.selectbox(
         "Which prayer are you marking?",
-        options=['-- Select Prayer --'] + prayer_names,
+        options=['-- Select Prayer --'] + PRAYER_NAMES,
         key='prayer_select'
     )
     
@@ -214,7 +189,7 @@ def render_mark_prayer(child_id):
         just_saved = st.session_state.get(JUST_SAVED_KEY, False)
         
         if just_saved:
-            daily_records_after_save = load_prayer_records().get(child_id, {}).get(today, {})
+            daily_records_after_save = services.day_records(child_id)
             
             st.success(f"Successfully recorded **{selected_prayer}**! Method: **{daily_records_after_save.get(selected_prayer, {}).get('method')}**")
             del st.session_state[JUST_SAVED_KEY]
@@ -252,7 +227,6 @@ def render_mark_prayer(child_id):
             key='primary_status_select'
         )
 
-        final_is_prayed = (primary_status == 'Yes, I prayed it.')
         final_method = None
         
         # 4. Conditional Secondary Selection
@@ -277,16 +251,7 @@ def render_mark_prayer(child_id):
         # 5. Save Button and Logic
         if st.button(f'Record {selected_prayer} Status'):
             
-            new_record = {
-                "is_prayed": final_is_prayed,
-                "method": final_method,
-                "time": str(time.strftime("%H:%M")) if final_is_prayed else None 
-            }
-            
-            if child_id not in all_records: all_records[child_id] = {}
-            if today not in all_records[child_id]: all_records[child_id][today] = {}
-            all_records[child_id][today][selected_prayer] = new_record
-            save_prayer_records(all_records)
+            services.record_prayer(child_id, selected_prayer, final_method)
             
             # --- Set the "Just Saved" flag and clean up other flags ---
             st.session_state[JUST_SAVED_KEY] = True
@@ -297,15 +262,49 @@ def render_mark_prayer(child_id):
             
             st.rerun()
 
+WHOLE_DAY_OPTIONS = {
+    "-- Not yet --": None,
+    "In Masjid (Congregation)": "Masjid",
+    "Alone (Individual)": "Alone",
+    "As Qada (Make-up)": "Kaza",
+    "Missed": "Missed",
+}
+
+@profiled('render')
+def render_mark_whole_day(child_id):
+    """Lets the child log all of today's prayers in one form, saved with a single write."""
+    st.header("Record Today's Prayers 📋")
+    
+    daily_records = services.day_records(child_id)
+    option_by_method = {method: label for label, method in WHOLE_DAY_OPTIONS.items()}
+    labels = list(WHOLE_DAY_OPTIONS)
+    
+    with st.form('mark_whole_day_form'):
+        choices = {}
+        for prayer in PRAYER_NAMES:
+            current_label = option_by_method.get(daily_records.get(prayer, {}).get('method'), labels[0])
+            choices[prayer] = st.selectbox(prayer, options=labels, index=labels.index(current_label),
+                                           key=f'whole_day_{prayer}')
+        submitted = st.form_submit_button("Record Today's Prayers")
+    
+    if submitted:
+        # Only prayers whose status changed are written
+        changed = {
+            prayer: WHOLE_DAY_OPTIONS[label] for prayer, label in choices.items()
+            if WHOLE_DAY_OPTIONS[label] is not None
+            and WHOLE_DAY_OPTIONS[label] != daily_records.get(prayer, {}).get('method')
+        }
+        if changed:
+            services.record_day(child_id, changed)
+            st.success(f"Recorded {len(changed)} prayer(s): " + ", ".join(f"**{p}** ({m})" for p, m in changed.items()))
+        else:
+            st.info("Nothing changed.")
+
 # ----------------------------------------------------------------------
 # PARENT RENDER FUNCTIONS
 # ----------------------------------------------------------------------
-import streamlit as st
-from datetime import date, datetime, timedelta
-import pandas as pd
-# NOTE: The load_prayer_records function is assumed to be defined elsewhere
-# from your main script, as well as the prayer_records structure.
 
+@profiled('render')
 def render_weekly_performance_metrics(child_id):
     """
     Calculates and displays key performance metrics for the current calendar week, 
@@ -314,66 +313,21 @@ def render_weekly_performance_metrics(child_id):
     st.header("This Week's Performance 🚀")
     st.markdown("---")
 
-    all_records = load_prayer_records()
-    child_records = all_records.get(child_id, {})
-    
-    if not child_records:
+    if not services.has_records(child_id):
         st.info("No records available for this child.")
         return
 
-    today = date.today()
-    
-    # Calculate the start of the week (Monday is 0, Sunday is 6)
-    # timedelta(days=today.weekday()) calculates how many days ago the last Monday was.
-    start_date = today - timedelta(days=today.weekday())
-    
-    # Initialize counters
-    total_prayed = 0
-    total_missed = 0
-    prayed_on_time = 0
-    prayed_kaza = 0
-    
-    # Dynamic denominator based on the number of days from Monday up to today (inclusive)
-    total_days_elapsed_this_week = 0
-
-    current_date = start_date
-    while current_date <= today:
-        # This counter will be 1 on Monday, 2 on Tuesday, 3 on Wednesday, etc.
-        total_days_elapsed_this_week += 1 
-        
-        date_str = str(current_date)
-        daily_prayers = child_records.get(date_str, {})
-        
-        # Check all 5 expected prayers for the day
-        for prayer_name in ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]:
-            data = daily_prayers.get(prayer_name)
-            
-            if data and 'method' in data:
-                method = data['method']
-                is_prayed = data.get('is_prayed')
-                
-                if is_prayed is False and method == 'Missed':
-                    total_missed += 1
-                elif is_prayed is True:
-                    total_prayed += 1
-                    if method in ["Masjid", "Alone"]:
-                        prayed_on_time += 1
-                    elif method == "Kaza":
-                        prayed_kaza += 1
-        
-        current_date += timedelta(days=1)
-        
-    # --- DYNAMIC CALCULATION OF MAX POSSIBLE PRAYERS ---
-    # Max possible is 5 * the number of days that have passed this week.
-    MAX_POSSIBLE_PRAYERS = 5 * total_days_elapsed_this_week
+    # This week's finalized days come from the nightly rollup; only the rest are counted live
+    stats = services.weekly_stats(child_id)
+    MAX_POSSIBLE_PRAYERS = stats['max_possible']
     
     
     if MAX_POSSIBLE_PRAYERS > 0:
-        # Calculate completion based on the current maximum possible prayers (e.g., 5, 10, 15...)
-        average_completion = (total_prayed / MAX_POSSIBLE_PRAYERS) * 100
+        # Completion against the current maximum possible prayers (e.g., 5, 10, 15...)
+        average_completion = stats['completion']
         
         # Combined on-time and Kaza breakdown (as a single metric)
-        on_time_kaza_ratio = f"{prayed_on_time} / {prayed_kaza}"
+        on_time_kaza_ratio = f"{stats['on_time']} / {stats['kaza']}"
         
         col1, col2, col3, col4 = st.columns(4)
 
@@ -387,13 +341,13 @@ def render_weekly_performance_metrics(child_id):
         with col2:
             st.metric(
                 label="Total Prayed (This Week)",
-                value=total_prayed
+                value=stats['prayed']
             )
             
         with col3:
             st.metric(
                 label="Total Prayers Missed",
-                value=total_missed
+                value=stats['missed']
             )
 
         with col4:
@@ -406,40 +360,72 @@ def render_weekly_performance_metrics(child_id):
     else:
         st.info("Start recording prayers to see weekly performance data.")
 
+@profiled('render')
+def render_long_range_stats(child_id):
+    """
+    Displays streaks, per-prayer consistency and the month-over-month trend
+    over the child's whole history (not just the selected date range).
+    """
+    st.header("Streaks & Consistency 🔥")
+    st.caption("All five prayers prayed counts as a complete day. Covers the whole history.")
+
+    stats = services.long_range_stats(child_id)
+    if stats['finalized_through']:
+        st.caption(f"History finalized through {stats['finalized_through']}; later days are counted live.")
+    months = stats['months']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(label="Current Streak", value=f"{stats['current_streak']} days")
+    with col2:
+        st.metric(
+            label="Longest Streak",
+            value=f"{stats['longest_streak']} days",
+            help=f"Ended on {stats['longest_streak_end']}" if stats['longest_streak_end'] else None
+        )
+    with col3:
+        if months:
+            change = months[-1]['Change (pts)']
+            st.metric(
+                label="Completion This Month",
+                value=f"{months[-1]['Completion (%)']:.1f}%",
+                delta=None if change is None else f"{change:+.1f} pts vs last month"
+            )
+
+    st.subheader("Consistency by Prayer")
+    st.bar_chart(stats['prayers'], x='Prayer', y=['Prayed (%)', 'On Time (%)'], stack=False)
+
+    if months:
+        st.subheader("Month over Month")
+        st.line_chart(months, x='Month', y='Completion (%)')
+        st.dataframe(months, hide_index=True, use_container_width=True)
+
+@profiled('render')
 def render_parent_manage_child():
     st.title("Manage Child Profiles 👨‍👩‍👧‍👦")
     st.markdown("---")
     
-    user_data = load_user_data()
-    children = user_data.get('children', [])
+    children = services.list_children()
 
     # 1. ADD CHILD SECTION (Calling the existing function logic)
     st.subheader("Add a New Child Profile")
     
     with st.form("add_child_form_manage", clear_on_submit=True):
         child_name = st.text_input('Child\'s Name', max_chars=30, key='new_child_name_input_manage')
+        child_pass = st.text_input('Child\'s Password', type="password", key='new_child_pass_input_manage')
         
         submit_button = st.form_submit_button('➕ Create Profile')
 
         if submit_button:
-            if child_name:
-                child_id = str(uuid.uuid4())[:8] 
-                
-                new_child = {"name": child_name.strip(), "id": child_id}
-                
-                if 'children' not in user_data:
-                    user_data['children'] = []
-                
-                user_data['children'].append(new_child)
-                save_user_data(user_data)
-                
-                st.success(f"Profile for **{child_name.strip()}** created! ID: `{child_id}`")
+            try:
+                new_child = services.add_child(child_name, child_pass)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Profile for **{new_child['name']}** created! ID: `{new_child['id']}`")
                 
                 # Rerun to update the list below
                 st.session_state.page = 'parent_manage_child'
                 st.rerun()
-            else:
-                st.error("Please enter a name for the child.")
 
     st.markdown("---")
     
@@ -449,8 +435,9 @@ def render_parent_manage_child():
     if not children:
         st.info("No child profiles have been created yet.")
     else:
-        # Create a DataFrame for clear display
-        df = pd.DataFrame(children)
+        # Create a DataFrame for clear display (passwords are never shown)
+        import pandas as pd
+        df = pd.DataFrame(children, columns=['name', 'id'])
         df.index = df.index + 1 # Start index at 1
         df.columns = ['Name', 'Login ID']
         st.dataframe(df, use_container_width=True)
@@ -468,30 +455,40 @@ def render_parent_manage_child():
             child_id_to_delete = child_names_to_delete[child_to_delete_name]
             
             if st.button(f'🗑️ Confirm Delete: {child_to_delete_name}'):
-                # Filter out the child to be deleted
-                user_data['children'] = [
-                    child for child in children if child['id'] != child_id_to_delete
-                ]
-                save_user_data(user_data)
+                # Removes the profile and their prayer records for a clean sweep
+                records_removed = services.delete_child(child_id_to_delete)
                 
                 st.warning(f"Profile for **{child_to_delete_name}** has been deleted.")
-                
-                # OPTIONAL: Also delete their prayer records for a clean sweep
-                prayer_records = load_prayer_records()
-                if child_id_to_delete in prayer_records:
-                    del prayer_records[child_id_to_delete]
-                    save_prayer_records(prayer_records)
+                if records_removed:
                     st.info(f"Associated prayer records were also removed.")
                 
                 # Rerun to update the list
                 st.session_state.page = 'parent_manage_child'
                 st.rerun()
 
+    st.markdown("---")
+    
+    # 3. BULK IMPORT SECTION
+    st.subheader("Bulk Import Prayer Records")
+    st.caption("Backfill marks from a CSV (with a header row) or JSONL file with the columns "
+               "`child_id` (or `child` name), `date`, `prayer`, `method` and optional `time`.")
+    
+    uploaded = st.file_uploader("Records file", type=['csv', 'jsonl'], key='bulk_import_file')
+    if uploaded is not None and st.button('📥 Import Records'):
+        import bulk_import
+        result = bulk_import.import_uploaded_file(uploaded, uploaded.name)
+        if result['error_count']:
+            st.error(f"{result['error_count']} of {result['rows']} rows are invalid; nothing was imported.")
+            st.code("\n".join(result['errors']))
+        else:
+            st.success(f"Imported {result['applied']} prayer marks.")
+    
     st.markdown("---")
     if st.button('⬅️ Back to Dashboard'):
         st.session_state.page = 'parent_dashboard'
         st.rerun()
 
+@profiled('render')
 def render_parent_setup():
     st.title('Parent Setup: Create Secret Key 🔑')
     st.warning('This key will protect the parent settings. Keep it secure!')
@@ -499,82 +496,150 @@ def render_parent_setup():
     new_key = st.text_input('Enter New 4-Digit Secret Key (e.g., 1234)', type="password", max_chars=4, key='parent_setup_key_input')
     
     if st.button('Save Key and Continue'):
-        if len(new_key) == 4 and new_key.isdigit():
-            user_data = {'parent_key': new_key, 'children': []}
-            save_user_data(user_data)
+        try:
+            services.set_parent_key(new_key)
+        except ValueError as e:
+            st.error(str(e))
+        else:
             st.success('Secret Key set successfully! Proceeding to the dashboard to add children.')
             st.session_state.page = 'parent_dashboard'
             st.rerun()
-        else:
-            st.error('Please enter a valid 4-digit key.')
 
+@profiled('render')
 def render_parent_login():
     st.title('Parent Login 🔒')
     
     entered_key = st.text_input('Enter Secret Key', type="password", max_chars=4, key='parent_login_key_input')
     
     if st.button('Login'):
-        user_data = load_user_data()
-        correct_key = user_data.get('parent_key')
-        
-        if entered_key == correct_key:
-            st.session_state.page = 'parent_dashboard'
-            st.rerun()
+        try:
+            authenticated = services.check_parent_key(entered_key)
+        except TooManyAttempts as e:
+            st.error(str(e))
         else:
-            st.error('Incorrect Secret Key. Please try again.')
+            if authenticated:
+                st.session_state.page = 'parent_dashboard'
+                st.rerun()
+            else:
+                st.error('Incorrect Secret Key. Please try again.')
 
-import plotly.express as px # Import Plotly for advanced charting
+ALL_CHILDREN_OPTION = '👨‍👩‍👧‍👦 All Children'
 
-import plotly.express as px
+DATE_RANGE_OPTIONS = {
+    'Last 7 days': 7,
+    'Last 30 days': 30,
+    'Last 90 days': 90,
+    'Custom range': None
+}
 
-def render_daily_method_bar_chart(child_id, prayer_records):
+@profiled('render')
+def render_date_range_picker():
     """
-    Renders a stacked bar chart showing the count of each prayer method (Masjid, Alone, Missed, etc.) 
-    for all 5 prayers on each day, across the entire tracked period.
+    Renders the dashboard's date-range picker in the sidebar and returns the
+    selected (start_date, end_date), both inclusive.
     """
-    st.subheader("Daily Prayer Method Breakdown")
+    today = date.today()
+    selected_range = st.sidebar.selectbox(
+        'Date Range:',
+        options=list(DATE_RANGE_OPTIONS.keys()),
+        index=1,
+        key='parent_date_range'
+    )
     
-    if not prayer_records:
-        st.info("No records available to generate a daily method breakdown chart.")
-        return
-
-    method_data = []
+    days = DATE_RANGE_OPTIONS[selected_range]
+    if days is not None:
+        return today - timedelta(days=days - 1), today
     
-    for date_str, daily_prayers in prayer_records.items():
-        for prayer_name, data in daily_prayers.items():
-            if data and 'method' in data:
-                method_data.append({
-                    'Date': pd.to_datetime(date_str),
-                    'Prayer': prayer_name,
-                    'Method': data['method']
-                })
+    picked = st.sidebar.date_input(
+        'Custom Range:',
+        value=(today - timedelta(days=29), today),
+        max_value=today,
+        key='parent_custom_range'
+    )
+    # While the user is still choosing, the widget only holds the start date
+    if isinstance(picked, (tuple, list)) and len(picked) == 2:
+        return picked[0], picked[1]
+    start_date = picked[0] if isinstance(picked, (tuple, list)) else picked
+    return start_date, start_date
 
-    df_methods = pd.DataFrame(method_data)
+@profiled('render')
+def render_export_button(children, start_date, end_date):
+    """Offers the selected children's records in the date range as a CSV (or Parquet) download."""
+    import export
     
-    if df_methods.empty:
-        st.info("No completed prayer records to display methods.")
-        return
-
-    # Count the occurrence of each method per day
-    df_methods_grouped = df_methods.groupby(['Date', 'Method']).size().reset_index(name='Count')
-    
-    fig = px.bar(
-        df_methods_grouped, 
-        x='Date', 
-        y='Count', 
-        color='Method',
-        title='Total Methods Used Per Day',
-        labels={'Count': 'Number of Prayers', 'Date': 'Day'},
-        # Order methods for better visualization
-        category_orders={"Method": ["Masjid", "Alone", "Kaza", "Missed"]},
-        height=400
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Export Records")
+    formats = ['csv', 'parquet'] if export.parquet_available() else ['csv']
+    fmt = st.sidebar.radio("Format", formats, format_func=str.upper, horizontal=True, key='export_format')
+    # The file is only built when the button is clicked, streamed child by child
+    household_id = services.current_household()
+    st.sidebar.download_button(
+        '⬇️ Download Records',
+        data=lambda: export.export_file(children, fmt, start_date, end_date, household_id),
+        file_name=export.export_filename(children, fmt, start_date, end_date),
+        mime='text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet',
+        on_click='ignore',
+        key='export_download'
     )
+
+@profiled('render')
+def render_daily_method_bar_chart(child_id, start_date, end_date):
+    """
+    Renders a stacked bar chart showing the count of each prayer method (Masjid, Alone, Missed, etc.) 
+    for all 5 prayers on each day of the selected date range.
+    """
+    st.subheader("Daily Prayer Method Breakdown")
+    
+    # pandas and Plotly are only imported once a chart is actually drawn.
+    # The figure is cached per (child, window) until this child's records change.
+    import charts
+    fig = charts.daily_method_figure(child_id, start_date, end_date)
     
-    fig.update_xaxes(dtick="D1", tickformat="%b %d") # Ensure one tick per day
-    fig.update_layout(barmode='stack', legend_title_text='Method')
+    if fig is None:
+        st.info("No completed prayer records in this date range.")
+        return
     
+    if charts.is_weekly_window(start_date, end_date):
+        st.caption(f"Long range: prayers are grouped by week (more than {charts.DAILY_BINS_MAX_DAYS} days).")
     st.plotly_chart(fig, use_container_width=True)
     
+@profiled('render')
+def render_household_comparison(children, start_date, end_date):
+    """
+    Renders a side-by-side comparison of every child: this week's completion
+    plus prayed, missed and method counts over the selected date range, all
+    computed from one household frame.
+    """
+    st.header("All Children: Household Comparison 👨‍👩‍👧‍👦")
+    st.caption(f"{start_date:%b %d, %Y} – {end_date:%b %d, %Y}")
+    st.markdown("---")
+    
+    if not children:
+        st.info("No child profiles have been created yet.")
+        return
+    
+    summary = services.household_comparison(children, start_date, end_date)
+    
+    st.dataframe(summary, use_container_width=True)
+    
+    method_columns = [column for column in summary.columns if column not in ('Weekly Completion (%)', 'Prayed')]
+    import plotly.express as px
+    method_mix = summary[method_columns].reset_index().melt(id_vars='Child', var_name='Method', value_name='Count')
+    with span('household_figure', 'plotly'):
+        fig = px.bar(
+            method_mix,
+            x='Child',
+            y='Count',
+            color='Method',
+            title='Prayer Methods per Child',
+            labels={'Count': 'Number of Prayers'},
+            category_orders={"Method": ["Masjid", "Alone", "Kaza", "Missed"]},
+            height=400
+        )
+        fig.update_layout(barmode='stack', legend_title_text='Method')
+    st.plotly_chart(fig, use_container_width=True)
+
+@profiled('render')
 def render_parent_dashboard():
     st.title('Parent Dashboard 📊')
     
@@ -583,71 +648,65 @@ def render_parent_dashboard():
         st.rerun()
     
     
-    user_data = load_user_data()
-    children = user_data.get('children', [])
+    children = services.list_children()
     
     # ... (Sidebar and Child Selection logic remains the same) ...
     
     child_names_map = {child['name']: child['id'] for child in children}
     selected_child_name = st.sidebar.selectbox(
         'Select Child to View Progress:',
-        options=['-- Select Child --'] + sorted(list(child_names_map.keys())),
+        options=['-- Select Child --', ALL_CHILDREN_OPTION] + sorted(list(child_names_map.keys())),
         key='parent_child_select'
     )
     
-    if selected_child_name != '-- Select Child --':
+    if selected_child_name == ALL_CHILDREN_OPTION:
+        start_date, end_date = render_date_range_picker()
+        render_household_comparison(children, start_date, end_date)
+        if children:
+            render_export_button(children, start_date, end_date)
+    
+    elif selected_child_name != '-- Select Child --':
         child_id = child_names_map[selected_child_name]
         st.header(f"Progress Report for {selected_child_name}")
         st.markdown("---")
         
-        prayer_records = load_prayer_records().get(child_id, {})
-        
-        if not prayer_records:
+        if not services.has_records(child_id):
             st.info(f"No prayer records found for **{selected_child_name}** yet. Ask them to mark a prayer!")
             
         else:
-            # ... (Code to create and display the 'Daily Prayer History' DataFrame remains the same) ...
+            start_date, end_date = render_date_range_picker()
+            render_export_button([child for child in children if child['id'] == child_id], start_date, end_date)
             
             # --- START OF CHARTING SECTION ---
             render_weekly_performance_metrics(child_id)
+            render_long_range_stats(child_id)
+            st.markdown("---")
             st.subheader("Summary of Prayer Methods")
-            # Aggregate method counts across all days    
-            all_methods = [
-                prayer['method'] 
-                for date_records in prayer_records.values() 
-                for prayer in date_records.values() 
-                if prayer and 'method' in prayer
-            ]
-            
-            method_counts = pd.Series(all_methods).value_counts().rename('Count')
+            st.caption(f"{start_date:%b %d, %Y} – {end_date:%b %d, %Y}")
+            # Only the selected window is loaded and counted
+            method_counts = services.method_breakdown(child_id, start_date, end_date)
             
             if not method_counts.empty:
                 st.bar_chart(method_counts)
+            else:
+                st.info("No prayer methods recorded in this date range.")
             
             st.markdown("---") # Visual separator between charts
 
             # --- CALL THE NEW LINE CHART FUNCTION HERE ---
-            render_daily_method_bar_chart(child_id, prayer_records)
+            render_daily_method_bar_chart(child_id, start_date, end_date)
             
     st.sidebar.markdown("---")
     if st.sidebar.button('⬅️ Log Out / Change Role'):
         st.session_state.page = 'role_selection'
         st.session_state.role = None
         st.rerun()  
-def authenticate_child(child_id: str, child_pass: str, children_list):
-    """
-    Checks if the provided ID and Password match any child record.
-    Returns True if successful, otherwise False.
-    """
-    for child in children_list:
-        if child["id"] == child_id and child["pass"] == child_pass:
-            return True
-    return False
 
 # ----------------------------------------------------------------------
 # CHILD LOGIN FUNCTION
 # ----------------------------------------------------------------------
 
+@profiled('render')
 def render_child_login():
     """
     Renders the password input form for the selected child and handles authentication.
@@ -666,18 +725,20 @@ def render_child_login():
     
     # Login button
     if st.button(f'Log in as {child_name}'):
-        user_data = load_user_data()
-        children_list = user_data.get('children', [])
-        
         # Perform authentication
-        if authenticate_child(child_id, password, children_list):
+        try:
+            authenticated = services.authenticate_child(child_id, password)
+        except TooManyAttempts as e:
+            st.error(str(e))
+            authenticated = None
+        if authenticated:
             st.session_state.logged_in = True
             st.session_state.role = 'child'
             st.session_state.page = 'child_tracker'
             st.success(f"Welcome back, {child_name}! Redirecting to tracker...")
             # Use st.rerun() to immediately transition to the tracker page
             st.rerun()
-        else:
+        elif authenticated is not None:
             st.error("❌ Incorrect password. Please try again.")
             
     # Back button to select a different profile
@@ -689,10 +750,11 @@ def render_child_login():
         st.rerun()          
 
 # ----------------------------------------------------------------------
-# MAIN PAGE RENDERING BLOCK
+# ROLE SELECTION AND CHILD SELECTION PAGES
 # ----------------------------------------------------------------------
 
-if st.session_state.page == 'role_selection':
+@profiled('render')
+def render_role_selection():
     st.title('Welcome to the Namaz Tracker! 🕌')
     st.header('Who is using the app?')
     
@@ -707,29 +769,40 @@ if st.session_state.page == 'role_selection':
         if st.button(f'Continue as {user_choice}'):
             set_role(user_choice.lower())
 
-# ----------------------------------------------------------------------
-# PARENT PAGES
-# ----------------------------------------------------------------------
-elif st.session_state.page == 'parent_setup':
-    render_parent_setup()
-elif st.session_state.page == 'parent_login':
-    render_parent_login()
-elif st.session_state.page == 'parent_dashboard':
-    render_parent_dashboard()
-elif st.session_state.page == 'parent_manage_child':
-    render_parent_manage_child()
+    render_household_picker()
 
-# ----------------------------------------------------------------------
-# CHILD PAGES
-# ----------------------------------------------------------------------
-# ----------------------------------------------------------------------
-# CHILD PAGES (REVISED FLOW)
-# ----------------------------------------------------------------------
-elif st.session_state.page == 'child_selection':
+def render_household_picker():
+    """
+    Shows which household (family) the app is working on, and lets the user
+    open another one by its code or register a new one.
+    """
+    st.markdown("---")
+    household = services.find_household(st.session_state.household_id)
+    st.caption(f"Household: **{household['name']}** · code `{household['id']}`")
+    
+    with st.expander("Switch or create a household"):
+        code = st.text_input("Household code", key='household_code_input')
+        if st.button("Open Household"):
+            found = services.find_household(code)
+            if found is None:
+                st.error("No household has that code.")
+            else:
+                switch_household(found['id'])
+        
+        name = st.text_input("New household name", key='new_household_name_input')
+        if st.button("Create Household"):
+            try:
+                created = services.create_household(name)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                switch_household(created['id'])
+
+@profiled('render')
+def render_child_selection():
     st.title('Select Your Profile 👧🏽')
     
-    user_data = load_user_data()
-    children_list = user_data.get('children', [])
+    children_list = services.list_children()
     
     # Create a dictionary for mapping names to IDs
     child_names = {child['name']: child['id'] for child in children_list}
@@ -750,16 +823,71 @@ elif st.session_state.page == 'child_selection':
             st.session_state.page = 'child_password_login' 
             st.rerun()
 
-# ----------------------------------------------------------------------
-# NEW CHILD PASSWORD LOGIN PAGE
-# ----------------------------------------------------------------------
-elif st.session_state.page == 'child_password_login':
-    # Call the new function to render the login form
-    render_child_login()
-    
-elif st.session_state.page == 'child_not_registered':
+def render_child_not_registered():
     st.title('You Need to Register! 🛑')
     # ... (rest of the child_not_registered code)
-    
-elif st.session_state.page == 'child_tracker':
-    render_child_tracker_page()    
+
+@profiled('render')
+def render_profile_panel(cache_stats_at_start):
+    """Shows where this rerun's time went, slowest spans first, in the sidebar."""
+    breakdown, wall_ms = profiling.rerun_breakdown()
+    cache_stats = get_cache_stats()
+    with st.sidebar.expander("⏱️ Rerun Profile", expanded=True):
+        st.metric("Rerun Time", f"{wall_ms:.1f} ms")
+        st.caption(
+            "Cache this rerun (process-wide): "
+            + ", ".join(f"{name} +{cache_stats[name] - cache_stats_at_start.get(name, 0)}"
+                        for name in cache_stats if name != 'entries')
+            + f" · {cache_stats['entries']} entries"
+        )
+        if breakdown:
+            import pandas as pd
+            st.dataframe(pd.DataFrame(breakdown), hide_index=True, use_container_width=True)
+
+# ----------------------------------------------------------------------
+# MAIN PAGE RENDERING BLOCK
+# ----------------------------------------------------------------------
+
+PAGES = {
+    'role_selection': render_role_selection,
+    # Parent pages
+    'parent_setup': render_parent_setup,
+    'parent_login': render_parent_login,
+    'parent_dashboard': render_parent_dashboard,
+    'parent_manage_child': render_parent_manage_child,
+    # Child pages
+    'child_selection': render_child_selection,
+    'child_password_login': render_child_login,
+    'child_not_registered': render_child_not_registered,
+    'child_tracker': render_child_tracker_page,
+}
+
+def main():
+    """Runs one rerun of the app: the current page, then the profile panel if enabled."""
+    init_session_state()
+    if SCHEDULER_ENABLED:
+        import scheduler
+        scheduler.start_background()
+    if REMINDERS_ENABLED:
+        import reminders
+        reminders.start_background()
+    # Every storage call in this rerun is scoped to the session's household
+    if services.find_household(st.session_state.household_id) is None:
+        st.session_state.household_id = DEFAULT_HOUSEHOLD
+    services.use_household(st.session_state.household_id)
+
+    # --- PROFILING (NAMAZ_PROFILE=1 or ?profile=1) ---
+    profiling.begin_rerun(enabled=st.query_params.get('profile') == '1')
+    cache_stats_at_start = get_cache_stats() if profiling.is_active() else None
+
+    render_page = PAGES.get(st.session_state.page)
+    if render_page:
+        render_page()
+
+    if profiling.is_active():
+        render_profile_panel(cache_stats_at_start)
+    profiling.end_rerun()
+
+# Streamlit runs this file as __main__; importing it (e.g. from a benchmark) renders nothing
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import copy
+import calendar
+from datetime import date, timedelta
+
+from aggregates import PRAYER_NAMES, ON_TIME_METHODS
+from profiling import profiled
+
+# ----------------------------------------------------------------------
+# STREAKS AND LONG-RANGE STATISTICS
+# ----------------------------------------------------------------------
+# build_prayer_stats() makes one pass over a child's date-sorted records
+# and keeps only running totals, so it is linear in history and its result
+# is small. It is cached per child and data version (see
+# services.long_range_stats); anything that depends on today's date is
+# worked out from that result at read time, so the cache survives midnight.
+# The pass can also resume from an earlier result (e.g. the nightly rollup
+# of finalized days, see rollups.py) over just the newer records.
+#
+# A "complete day" is one where all five prayers were marked as prayed
+# (in the masjid, alone or as qada); streaks count consecutive complete days.
+
+def _empty_prayer_counts():
+    return {"marked": 0, "prayed": 0, "on_time": 0}
+
+
+def _empty_month():
+    return {"prayed": 0, "missed": 0, "on_time": 0, "kaza": 0, "complete_days": 0}
+
+
+@profiled('aggregation')
+def build_prayer_stats(child_records, base=None):
+    """
+    Returns streak, per-prayer and monthly totals from a {date: {prayer: record}}
+    mapping in a single pass over its dates in order:
+
+        {"first_date", "last_date",            # 'YYYY-MM-DD' or None
+         "longest_streak", "longest_streak_end",
+         "last_run", "last_run_end",           # the most recent run of complete days
+         "prayers": {prayer: {"marked", "prayed", "on_time"}},
+         "months": {"YYYY-MM": {"prayed", "missed", "on_time", "kaza", "complete_days"}}}
+
+    With `base` (an earlier result, left untouched) the pass continues from
+    it; every date in `child_records` must then be later than the dates it covers.
+    """
+    if base is not None:
+        stats = copy.deepcopy(base)
+    else:
+        stats = {
+            "first_date": None, "last_date": None,
+            "longest_streak": 0, "longest_streak_end": None,
+            "last_run": 0, "last_run_end": None,
+            "prayers": {name: _empty_prayer_counts() for name in PRAYER_NAMES},
+            "months": {},
+        }
+    run = stats['last_run']
+    run_end = None if stats['last_run_end'] is None else date.fromisoformat(stats['last_run_end'])
+
+    for date_str in sorted(child_records):
+        daily = child_records[date_str]
+        day = date.fromisoformat(date_str)
+        month = stats['months'].setdefault(date_str[:7], _empty_month())
+        if stats['first_date'] is None:
+            stats['first_date'] = date_str
+        stats['last_date'] = date_str
+
+        complete = True
+        for prayer in PRAYER_NAMES:
+            record = daily.get(prayer) or {}
+            method = record.get('method')
+            prayed = record.get('is_prayed') is True
+            complete = complete and prayed
+            if method is None:
+                continue
+
+            counts = stats['prayers'][prayer]
+            counts['marked'] += 1
+            if prayed:
+                counts['prayed'] += 1
+                month['prayed'] += 1
+                if method in ON_TIME_METHODS:
+                    counts['on_time'] += 1
+                    month['on_time'] += 1
+                elif method == 'Kaza':
+                    month['kaza'] += 1
+            elif method == 'Missed':
+                month['missed'] += 1
+
+        if complete:
+            run = run + 1 if run_end is not None and day - run_end == timedelta(days=1) else 1
+            run_end = day
+            month['complete_days'] += 1
+            if run > stats['longest_streak']:
+                stats['longest_streak'], stats['longest_streak_end'] = run, date_str
+
+    stats['last_run'] = run
+    stats['last_run_end'] = None if run_end is None else str(run_end)
+    return stats
+
+
+def current_streak(stats, today=None):
+    """
+    Returns the run of complete days that is still alive: ending today, or
+    yesterday while today's prayers may still be pending. Otherwise 0.
+    """
+    today = today or date.today()
+    if stats['last_run_end'] is None:
+        return 0
+    gap = (today - date.fromisoformat(stats['last_run_end'])).days
+    return stats['last_run'] if gap in (0, 1) else 0
+
+
+def prayer_consistency(stats):
+    """Returns one row per prayer: marked days, prayed and on-time percentages."""
+    rows = []
+    for prayer in PRAYER_NAMES:
+        counts = stats['prayers'][prayer]
+        marked = counts['marked']
+        rows.append({
+            "Prayer": prayer,
+            "Marked": marked,
+            "Prayed (%)": round(counts['prayed'] / marked * 100, 1) if marked else 0.0,
+            "On Time (%)": round(counts['on_time'] / marked * 100, 1) if marked else 0.0,
+        })
+    return rows
+
+
+def monthly_trend(stats, months=12, today=None):
+    """
+    Returns up to `months` rows, oldest first, ending with the current month:
+    prayed, missed and complete days, completion as a percentage of the
+    prayers possible in the month so far, and the change from the month before.
+    """
+    today = today or date.today()
+    year, month = today.year, today.month
+    keys = []
+    for _ in range(months):
+        keys.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    keys.reverse()
+
+    first = stats['first_date'][:7] if stats['first_date'] else None
+    rows, previous = [], None
+    for year, month in keys:
+        key = f"{year:04d}-{month:02d}"
+        if first is None or key < first:
+            continue
+        counters = stats['months'].get(key) or _empty_month()
+        days = today.day if (year, month) == (today.year, today.month) else calendar.monthrange(year, month)[1]
+        completion = round(counters['prayed'] / (5 * days) * 100, 1)
+        rows.append({
+            "Month": key,
+            "Prayed": counters['prayed'],
+            "Missed": counters['missed'],
+            "Complete Days": counters['complete_days'],
+            "Completion (%)": completion,
+            "Change (pts)": None if previous is None else round(completion - previous, 1),
+        })
+        previous = completion
+    return rows
@@ -0,0 +1,182 @@
+import os
+import threading
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# OFFLINE PRAYER-TIME SCHEDULE
+# ----------------------------------------------------------------------
+# Times are computed from the sun's position (the standard PrayTimes
+# formulas), one whole year per (location, method, asr, year) in a single
+# vectorized pass, and kept as a compact int16 array of minutes since
+# midnight. Looking up a date is then an index into that array.
+#
+# Above about 65 degrees the sun doesn't set (or rise) on some days. Those
+# days use the "nearest latitude" rule: the whole day is computed as if at
+# FALLBACK_LATITUDE (on the same side of the equator), where every time is
+# defined. Twilight angles that are never reached use the angle-based rule.
+
+PRAYER_NAMES = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+SCHEDULE_COLUMNS = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+# Fajr angle, and Isha as an angle or as minutes after Maghrib
+CALCULATION_METHODS = {
+    'MWL': {'fajr': 18.0, 'isha': 17.0},            # Muslim World League
+    'ISNA': {'fajr': 15.0, 'isha': 15.0},           # Islamic Society of North America
+    'Egypt': {'fajr': 19.5, 'isha': 17.5},          # Egyptian General Authority of Survey
+    'Makkah': {'fajr': 18.5, 'isha_minutes': 90},   # Umm al-Qura University, Makkah
+    'Karachi': {'fajr': 18.0, 'isha': 18.0},        # University of Islamic Sciences, Karachi
+}
+
+# Shadow length factor for Asr
+ASR_FACTORS = {'Standard': 1, 'Hanafi': 2}
+
+SUNRISE_ANGLE = 0.833
+
+# Latitude (degrees) used on days the sun doesn't rise or set at the real one
+FALLBACK_LATITUDE = 48.5
+
+# --- LOCATION CONFIGURATION ---
+DEFAULT_LOCATION = {
+    'latitude': float(os.environ.get('NAMAZ_LATITUDE', 21.4225)),
+    'longitude': float(os.environ.get('NAMAZ_LONGITUDE', 39.8262)),
+    'timezone': os.environ.get('NAMAZ_TIMEZONE', 'Asia/Riyadh'),
+}
+DEFAULT_METHOD = os.environ.get('NAMAZ_CALC_METHOD', 'MWL')
+DEFAULT_ASR = os.environ.get('NAMAZ_ASR', 'Standard')
+
+_schedule_lock = threading.Lock()
+_schedules = {}  # (lat, lng, timezone, method, asr, year) -> int16 array [day_of_year, column]
+
+
+def _sun_position(jd):
+    """Returns (declination in degrees, equation of time in hours) for Julian dates."""
+    d = jd - 2451545.0
+    g = np.radians(357.529 + 0.98560028 * d)
+    q = 280.459 + 0.98564736 * d
+    ecliptic_lng = np.radians(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+
+    declination = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(ecliptic_lng)))
+    right_ascension = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecliptic_lng), np.cos(ecliptic_lng))) / 15
+    equation_of_time = q / 15 - np.mod(right_ascension, 24)
+    equation_of_time = np.mod(equation_of_time + 12, 24) - 12
+    return declination, equation_of_time
+
+
+def _hour_angle(altitude, declination, latitude):
+    """Hours between solar noon and the sun reaching `altitude` degrees (NaN if it never does)."""
+    lat = np.radians(latitude)
+    dec = np.radians(declination)
+    cos_h = (np.sin(np.radians(altitude)) - np.sin(dec) * np.sin(lat)) / (np.cos(dec) * np.cos(lat))
+    with np.errstate(invalid='ignore'):
+        return np.degrees(np.arccos(cos_h)) / 15
+
+
+def compute_year_schedule(latitude, longitude, timezone, method=DEFAULT_METHOD, asr=DEFAULT_ASR, year=None):
+    """
+    Computes a whole year's times in one vectorized pass. Returns an int16
+    array of shape (days_in_year, len(SCHEDULE_COLUMNS)) holding local
+    minutes since midnight (0 to 1439, DST included), or -1 where a time is
+    undefined (only for an invalid latitude).
+    """
+    year = year or date.today().year
+    params = CALCULATION_METHODS[method]
+    first_day = date(year, 1, 1)
+    days = (date(year + 1, 1, 1) - first_day).days
+
+    tz = ZoneInfo(timezone)
+    utc_offsets = np.array([
+        datetime.combine(first_day + timedelta(days=n), datetime.min.time().replace(hour=12), tz)
+        .utcoffset().total_seconds() / 3600
+        for n in range(days)
+    ])
+
+    # Julian date at local noon, corrected for longitude
+    jd = 2451544.5 + (first_day - date(2000, 1, 1)).days + np.arange(days) + 0.5 - longitude / 360
+    declination, equation_of_time = _sun_position(jd)
+
+    dhuhr = 12 + utc_offsets - longitude / 15 - equation_of_time
+    sun_horizon = _hour_angle(-SUNRISE_ANGLE, declination, latitude)
+    if abs(latitude) > FALLBACK_LATITUDE:
+        # Days without a sunrise or sunset take the nearest latitude's times
+        latitude = np.where(np.isnan(sun_horizon), np.copysign(FALLBACK_LATITUDE, latitude), latitude)
+        sun_horizon = _hour_angle(-SUNRISE_ANGLE, declination, latitude)
+    sunrise = dhuhr - sun_horizon
+    maghrib = dhuhr + sun_horizon
+
+    asr_altitude = np.degrees(np.arctan(1 / (ASR_FACTORS[asr] + np.tan(np.radians(np.abs(latitude - declination))))))
+    asr_time = dhuhr + _hour_angle(asr_altitude, declination, latitude)
+
+    # At high latitudes twilight angles may never be reached; fall back to a
+    # fraction of the night proportional to the angle (the "angle-based" rule)
+    night = 24 - (maghrib - sunrise)
+    fajr_angle = params['fajr']
+    fajr = dhuhr - _hour_angle(-fajr_angle, declination, latitude)
+    fajr = np.where(np.isnan(fajr), sunrise - night * fajr_angle / 60, fajr)
+
+    if 'isha_minutes' in params:
+        isha = maghrib + params['isha_minutes'] / 60
+    else:
+        isha = dhuhr + _hour_angle(-params['isha'], declination, latitude)
+        isha = np.where(np.isnan(isha), maghrib + night * params['isha'] / 60, isha)
+
+    hours = np.stack([fajr, sunrise, dhuhr, asr_time, maghrib, isha], axis=1)
+    # Wrapped after rounding, so 23:59:30 becomes 00:00 and not minute 1440
+    minutes = np.mod(np.round(hours * 60), 24 * 60)
+    return np.where(np.isnan(minutes), -1, minutes).astype(np.int16)
+
+
+def schedule_zone(location=None):
+    """Returns the time zone a location's schedule is computed in (its minutes are local to it)."""
+    return ZoneInfo((location or DEFAULT_LOCATION)['timezone'])
+
+
+def schedule_now(location=None):
+    """Returns the current time as an aware datetime in the schedule's zone."""
+    return datetime.now(schedule_zone(location))
+
+
+def schedule_today(location=None):
+    """Returns today's date in the schedule's zone, which may differ from the server's."""
+    return schedule_now(location).date()
+
+
+def in_schedule_zone(moment, location=None):
+    """Converts an aware datetime to the schedule's zone; a naive one is taken to be local to it."""
+    zone = schedule_zone(location)
+    return moment.replace(tzinfo=zone) if moment.tzinfo is None else moment.astimezone(zone)
+
+
+def get_year_schedule(location=None, method=DEFAULT_METHOD, asr=DEFAULT_ASR, year=None):
+    """Returns the cached year table for a location, computing it on first use."""
+    location = location or DEFAULT_LOCATION
+    year = year or schedule_today(location).year
+    key = (round(location['latitude'], 4), round(location['longitude'], 4),
+           location['timezone'], method, asr, year)
+
+    with _schedule_lock:
+        schedule = _schedules.get(key)
+    if schedule is None:
+        schedule = compute_year_schedule(location['latitude'], location['longitude'],
+                                         location['timezone'], method, asr, year)
+        with _schedule_lock:
+            schedule = _schedules.setdefault(key, schedule)
+    return schedule
+
+
+def get_prayer_minutes(for_date=None, location=None, method=DEFAULT_METHOD, asr=DEFAULT_ASR):
+    """Returns {name: minutes since midnight} for Fajr, Sunrise, Dhuhr, Asr, Maghrib and Isha."""
+    for_date = for_date or schedule_today(location)
+    row = get_year_schedule(location, method, asr, for_date.year)[for_date.timetuple().tm_yday - 1]
+    return {name: int(minutes) for name, minutes in zip(SCHEDULE_COLUMNS, row)}
+
+
+def format_minutes(minutes):
+    """Formats minutes since midnight as '05:45 AM' ('--:--' if undefined)."""
+    if minutes < 0:
+        return '--:--'
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
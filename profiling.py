@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+# ----------------------------------------------------------------------
+# PER-RERUN HOT-PATH PROFILING
+# ----------------------------------------------------------------------
+# Enabled with NAMAZ_PROFILE=1 (every session) or by opening the app with
+# ?profile=1 (hidden per-session toggle). Spans are collected per rerun in
+# thread-local state, since Streamlit runs each session's script on its
+# own thread. If NAMAZ_TRACE_FILE is set, every rerun's spans are also
+# appended to that file in Chrome trace format (open it in
+# chrome://tracing or https://ui.perfetto.dev).
+
+PROFILE_ENV_ENABLED = os.environ.get('NAMAZ_PROFILE') == '1'
+TRACE_FILE = os.environ.get('NAMAZ_TRACE_FILE')
+
+_state = threading.local()
+_trace_lock = threading.Lock()
+
+
+def begin_rerun(enabled=False):
+    """Starts collecting spans for this rerun if profiling is enabled."""
+    if PROFILE_ENV_ENABLED or enabled:
+        _state.spans = []
+        _state.stack = []
+        _state.started = time.perf_counter()
+    else:
+        _state.spans = None
+
+
+def is_active():
+    """Returns True while the current rerun is being profiled."""
+    return getattr(_state, 'spans', None) is not None
+
+
+@contextmanager
+def span(name, category='code'):
+    """Times the enclosed block as one span (a no-op when profiling is off)."""
+    spans = getattr(_state, 'spans', None)
+    if spans is None:
+        yield
+        return
+
+    record = {"name": name, "cat": category, "start": time.perf_counter(), "child": 0.0}
+    _state.stack.append(record)
+    try:
+        yield
+    finally:
+        _state.stack.pop()
+        record['dur'] = time.perf_counter() - record['start']
+        record['self'] = record['dur'] - record.pop('child')
+        if _state.stack:
+            _state.stack[-1]['child'] += record['dur']
+        spans.append(record)
+
+
+def profiled(category, name=None):
+    """Decorator that records every call of the function as a span."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_state, 'spans', None) is None:
+                return func(*args, **kwargs)
+            with span(span_name, category):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def rerun_breakdown():
+    """
+    Aggregates this rerun's spans by name: calls, total and self time in ms,
+    slowest first. Also returns the wall time of the rerun so far.
+    """
+    spans = getattr(_state, 'spans', None) or []
+    rows = {}
+    for record in spans:
+        row = rows.setdefault(record['name'], {
+            "Span": record['name'], "Category": record['cat'], "Calls": 0, "Total (ms)": 0.0, "Self (ms)": 0.0
+        })
+        row['Calls'] += 1
+        row['Total (ms)'] += record['dur'] * 1000
+        row['Self (ms)'] += record['self'] * 1000
+
+    breakdown = sorted(rows.values(), key=lambda row: row['Self (ms)'], reverse=True)
+    for row in breakdown:
+        row['Total (ms)'] = round(row['Total (ms)'], 3)
+        row['Self (ms)'] = round(row['Self (ms)'], 3)
+    started = getattr(_state, 'started', None)
+    wall_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+    return breakdown, wall_ms
+
+
+def end_rerun():
+    """Appends this rerun's spans to NAMAZ_TRACE_FILE (if set) and stops collecting."""
+    spans = getattr(_state, 'spans', None)
+    _state.spans = None
+    if not spans or not TRACE_FILE:
+        return
+
+    pid, tid = os.getpid(), threading.get_ident()
+    events = [
+        {"name": record['name'], "cat": record['cat'], "ph": "X", "pid": pid, "tid": tid,
+         "ts": record['start'] * 1e6, "dur": record['dur'] * 1e6}
+        for record in spans
+    ]
+    # The Chrome trace "JSON array" format tolerates a missing closing bracket,
+    # which lets every rerun append without rewriting the file
+    with _trace_lock:
+        new_file = not os.path.exists(TRACE_FILE) or os.path.getsize(TRACE_FILE) == 0
+        with open(TRACE_FILE, 'a') as f:
+            if new_file:
+                f.write('[\n')
+            for event in events:
+                f.write(json.dumps(event) + ',\n')
@@ -0,0 +1,196 @@
+import os
+import heapq
+import logging
+import argparse
+import itertools
+import threading
+from datetime import timedelta
+
+import services
+from prayer_times import schedule_now, in_schedule_zone
+from storage import append_log_event, load_households, household_scope, DEFAULT_HOUSEHOLD
+
+# ----------------------------------------------------------------------
+# PRAYER REMINDERS
+# ----------------------------------------------------------------------
+# Reminds a child when a prayer's time (plus REMINDER_GRACE_MINUTES) has
+# passed without a mark. Instead of polling every child every minute, the
+# engine keeps one heap entry per child, keyed on when that child's next
+# prayer falls due. A single worker sleeps until the earliest entry, checks
+# just that child's day, notifies if the prayer is still unmarked and
+# pushes the child's following prayer: O(log n) per reminder.
+#
+# Delivery goes through a notifier, any object with notify(reminder); the
+# built-in LogNotifier appends JSON lines to a file and stands in for push
+# or SMS delivery. New children are picked up by a periodic roster refresh.
+#
+#   python reminders.py --log reminders.log
+#
+# In the app process: NAMAZ_REMINDERS=1 (written to NAMAZ_REMINDER_LOG).
+#
+# Due times are aware datetimes in the prayer schedule's time zone
+# (NAMAZ_TIMEZONE), whatever the server's own zone is.
+
+ROSTER_REFRESH = timedelta(minutes=10)
+REMINDER_LOG_FILE = os.environ.get('NAMAZ_REMINDER_LOG', 'reminders.log')
+
+logger = logging.getLogger(__name__)
+
+
+class LogNotifier:
+    """Appends every reminder as one JSON line to a file."""
+
+    def __init__(self, path=REMINDER_LOG_FILE):
+        self.path = path
+
+    def notify(self, reminder):
+        append_log_event(self.path, reminder)
+
+
+class ReminderEngine:
+    """
+    Sends one reminder per unmarked prayer per child through `notifier`.
+    `clock` returns the current time: an aware datetime, or a naive one in
+    the schedule's time zone (the default reads the real clock in that zone).
+    """
+
+    def __init__(self, notifier, clock=schedule_now):
+        self.notifier = notifier
+        self.clock = clock
+        self._queue = []  # (due, seq, household_id, child_id, day, prayer); child_id None = roster refresh
+        self._seq = itertools.count()
+        self._scheduled = set()  # (household_id, child_id) with an entry in the queue
+        self._wakeup = threading.Event()
+        self._stopping = False
+
+    # --- Queue ---
+
+    def _push(self, due, household_id=None, child_id=None, day=None, prayer=None):
+        heapq.heappush(self._queue, (due, next(self._seq), household_id, child_id, day, prayer))
+
+    def _schedule_next(self, household_id, child_id, after):
+        """Queues the child's first prayer falling due after `after` (today's or tomorrow's)."""
+        for day in (after.date(), after.date() + timedelta(days=1)):
+            for prayer, due in services.prayer_due_times(day):
+                if due > after:
+                    self._push(due, household_id, child_id, day, prayer)
+                    self._scheduled.add((household_id, child_id))
+                    return
+
+    def refresh_roster(self, now=None):
+        """
+        Queues every child not yet scheduled, across all households. A failing
+        household is logged and skipped (and retried on the next refresh).
+        Returns how many children were added.
+        """
+        now = self.now() if now is None else in_schedule_zone(now)
+        added = 0
+        try:
+            household_ids = [DEFAULT_HOUSEHOLD] + sorted(load_households())
+        except Exception:
+            logger.exception("Loading the household registry failed")
+            household_ids = [DEFAULT_HOUSEHOLD]
+        for household_id in household_ids:
+            try:
+                with household_scope(household_id):
+                    for child in services.list_children():
+                        if (household_id, child['id']) not in self._scheduled:
+                            self._schedule_next(household_id, child['id'], now)
+                            added += 1
+            except Exception:
+                logger.exception("Scheduling reminders for household %s failed", household_id)
+        self._push(now + ROSTER_REFRESH)
+        return added
+
+    def now(self):
+        """Returns the clock's time in the schedule's zone."""
+        return in_schedule_zone(self.clock())
+
+    def next_due(self):
+        """Returns when the earliest queued entry falls due, or None if the queue is empty."""
+        return self._queue[0][0] if self._queue else None
+
+    # --- Processing ---
+
+    def _remind(self, household_id, child_id, day, prayer, due):
+        """Notifies about one prayer if it's still unmarked. Returns False if the child is gone."""
+        if services.find_household(household_id) is None:
+            return False
+        with household_scope(household_id):
+            child = services.find_child(child_id)
+            if child is None:
+                return False
+            marked = (services.day_records(child_id, day).get(prayer) or {}).get('method')
+        if not marked:
+            reminder = {"household_id": household_id, "child_id": child_id, "child_name": child['name'],
+                        "date": str(day), "prayer": prayer,
+                        "due": due.isoformat(timespec='minutes')}
+            try:
+                self.notifier.notify(reminder)
+            except Exception:
+                logger.exception("Delivering a reminder for %s/%s failed", household_id, child_id)
+        return True
+
+    def run_pending(self, now=None):
+        """Handles every entry that is due by `now`. Returns the number of prayers checked."""
+        now = self.now() if now is None else in_schedule_zone(now)
+        checked = 0
+        while self._queue and self._queue[0][0] <= now:
+            due, _, household_id, child_id, day, prayer = heapq.heappop(self._queue)
+            if child_id is None:
+                self.refresh_roster(now)
+                continue
+            checked += 1
+            try:
+                keep = self._remind(household_id, child_id, day, prayer, due)
+            except Exception:
+                # Keep the child scheduled; the household may be readable again by the next prayer
+                logger.exception("Checking %s/%s for a reminder failed", household_id, child_id)
+                keep = True
+            if keep:
+                self._schedule_next(household_id, child_id, due)
+            else:
+                self._scheduled.discard((household_id, child_id))
+        return checked
+
+    def run(self):
+        """Processes reminders until stop() is called."""
+        if not self._queue:
+            self.refresh_roster()
+        while not self._stopping:
+            self.run_pending()
+            due = self.next_due()
+            timeout = None if due is None else max((due - self.now()).total_seconds(), 0)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def start_background(notifier=None):
+    """Starts the process-wide reminder thread on the first call (with a LogNotifier by default)."""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = ReminderEngine(notifier or LogNotifier())
+            threading.Thread(target=_background.run, name='namaz-reminders', daemon=True).start()
+        return _background
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Send prayer reminders for unmarked prayers.')
+    parser.add_argument('--log', default=REMINDER_LOG_FILE, help='File the reminders are appended to.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    engine = ReminderEngine(LogNotifier(args.log))
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        engine.stop()
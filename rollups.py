@@ -0,0 +1,195 @@
+import logging
+from datetime import date, timedelta
+
+import cache
+import aggregates
+import prayer_stats
+from aggregates import PRAYER_NAMES, empty_counters, add_counters, week_start
+from locking import file_lock, atomic_write_json
+from storage import get_storage, household_paths, current_household, load_document, read_shared, CorruptDataError
+
+# ----------------------------------------------------------------------
+# FINALIZED-DAY ROLLUPS
+# ----------------------------------------------------------------------
+# Once a day is over it can be finalized (see scheduler.py): unrecorded
+# prayers are optionally marked Missed, and the day is folded into
+# per-child summaries kept in the household's ROLLUPS_FILE:
+#
+#   {"version": 2, "children": {child_id: {
+#       "finalized_through": "YYYY-MM-DD" or None,
+#       "tracking_since": "YYYY-MM-DD",      # first day eligible for Missed auto-fill
+#       "week": {"start": monday, "counters": counters of its finalized days} or None,
+#       "stats": prayer_stats state (streaks, per-prayer and monthly totals)}}}
+#
+# The weekly metrics (services.weekly_stats) and the long-range statistics
+# (services.long_range_stats) read these for the finalized past and only
+# scan the records after `finalized_through` live. Only the latest week is
+# kept, so the file doesn't grow with the length of the history. A
+# finalized day's summary is never edited: a mark that lands on an already
+# finalized day (a backfill) discards the child's rollup, and the next
+# finalization rebuilds it. Files of an older version are rebuilt the same way,
+# and so is a damaged file without a good copy to restore.
+
+ROLLUPS_VERSION = 2
+
+MISSED_RECORD = {"is_prayed": False, "method": "Missed", "time": None}
+
+logger = logging.getLogger(__name__)
+
+
+def _rollups_file():
+    return household_paths(current_household())['rollups_file']
+
+
+def _group():
+    return f"{get_storage().namespace}:rollups"
+
+
+def _read(path, repair=True):
+    """Returns the rollups in `path`, {} if there are none (or none usable) yet."""
+    try:
+        document = load_document(path, repair=repair)
+    except CorruptDataError as error:
+        logger.error("%s; the rollups will be rebuilt", error)
+        return {}
+    if not isinstance(document, dict) or document.get('version') != ROLLUPS_VERSION:
+        return {}
+    return document.get('children', {})
+
+
+def load_rollups():
+    """Returns the current household's {child_id: rollup}, cached until the file changes."""
+    path = _rollups_file()
+    return cache.get_or_load((_group(),), cache.file_signature(path),
+                             lambda: read_shared(path, lambda repair: _read(path, repair)))
+
+
+def get_rollup(child_id):
+    """Returns a child's rollup, or None if none of their days have been finalized."""
+    return load_rollups().get(child_id)
+
+
+def _update(mutator):
+    """Applies `mutator(rollups)` to the freshest rollups under the file lock and saves them."""
+    path = _rollups_file()
+    try:
+        with file_lock(path):
+            rollups = _read(path)
+            result = mutator(rollups)
+            atomic_write_json(path, {"version": ROLLUPS_VERSION, "children": rollups}, backup=True)
+            return result
+    finally:
+        cache.invalidate(_group())
+
+
+def _empty_rollup(tracking_since):
+    return {"finalized_through": None, "tracking_since": tracking_since, "week": None, "stats": None}
+
+
+def _missing_marks(child_id, child_records, first, last):
+    """Returns a Missed mark for every prayer without a record from `first` to `last`."""
+    marks = []
+    day = first
+    while day <= last:
+        daily = child_records.get(str(day)) or {}
+        for prayer in PRAYER_NAMES:
+            if not daily.get(prayer) or daily[prayer].get('method') is None:
+                marks.append((child_id, str(day), prayer, dict(MISSED_RECORD)))
+        day += timedelta(days=1)
+    return marks
+
+
+def _fold(rollup, child_records, through):
+    """Folds a child's newly finalized records (the days after its rollup, up to `through`) into it."""
+    rollup['stats'] = prayer_stats.build_prayer_stats(child_records, rollup['stats'])
+    monday = week_start(str(through))
+    week = rollup['week'] if rollup['week'] and rollup['week']['start'] == monday else None
+    counters = empty_counters() if week is None else week['counters']
+    new_week = aggregates.build_child_aggregates(child_records)['weeks'].get(monday)
+    if new_week:
+        add_counters(counters, new_week)
+    rollup['week'] = {"start": monday, "counters": counters}
+    rollup['finalized_through'] = str(through)
+
+
+def finalize_children(child_ids, through, fill_missed=False):
+    """
+    Finalizes the days of several children of the current household up to
+    and including `through`, with one read and one write of the rollups
+    file: with `fill_missed`, prayers left unrecorded since a child's
+    tracking began are stored as Missed (in one storage write), then the
+    days not yet covered are folded into each child's rollup. Returns
+    {child_id: number of days newly finalized}.
+    """
+    storage = get_storage()
+    through = date.fromisoformat(str(through))
+
+    def finalize(rollups):
+        days = {}
+        pending = {}  # child_id -> (rollup, records after its finalized days)
+        missing = []
+        for child_id in child_ids:
+            days[child_id] = 0
+            rollup = rollups.get(child_id) or _empty_rollup(str(through + timedelta(days=1)))
+            if rollup['finalized_through'] is not None and rollup['finalized_through'] >= str(through):
+                continue
+            start = None
+            if rollup['finalized_through'] is not None:
+                start = date.fromisoformat(rollup['finalized_through']) + timedelta(days=1)
+
+            child_records = dict(storage.get_records(child_id, start, through))
+            if fill_missed:
+                first = max(start or date.min, date.fromisoformat(rollup['tracking_since']))
+                marks = _missing_marks(child_id, child_records, first, through)
+                missing.extend(marks)
+                for _, date_str, prayer, record in marks:
+                    child_records[date_str] = dict(child_records.get(date_str) or {}, **{prayer: record})
+            pending[child_id] = (rollup, child_records)
+            days[child_id] = (through - start).days + 1 if start else len(child_records)
+
+        if missing:
+            storage.save_prayer_marks(missing)
+        for child_id, (rollup, child_records) in pending.items():
+            _fold(rollup, child_records, through)
+            rollups[child_id] = rollup
+        return days
+    return _update(finalize)
+
+
+def finalize_child(child_id, through, fill_missed=False):
+    """Finalizes one child's days up to `through` (see finalize_children). Returns the days newly finalized."""
+    return finalize_children([child_id], through, fill_missed)[child_id]
+
+
+def reopen(child_id, date_str):
+    """
+    Discards a child's rollup if `date_str` is a day it already covers, so
+    the next finalization rebuilds it with the new mark. Returns True if it did.
+    """
+    rollup = get_rollup(child_id)
+    if rollup is None or rollup['finalized_through'] is None or date_str > rollup['finalized_through']:
+        return False
+
+    def discard(rollups):
+        current = rollups.get(child_id)
+        if current and current['finalized_through'] and date_str <= current['finalized_through']:
+            rollups[child_id] = _empty_rollup(current['tracking_since'])
+    _update(discard)
+    return True
+
+
+def forget(child_id):
+    """Removes a deleted child's rollup."""
+    if get_rollup(child_id) is not None:
+        _update(lambda rollups: rollups.pop(child_id, None))
+
+
+def week_counters(child_id, monday):
+    """
+    Returns (counters of the week starting `monday` over its finalized days,
+    last finalized day), or None if the child's rollup doesn't cover that week.
+    """
+    rollup = get_rollup(child_id)
+    if rollup is None or not rollup['week'] or rollup['week']['start'] != monday:
+        return None
+    return rollup['week']['counters'], rollup['finalized_through']
@@ -0,0 +1,121 @@
+import os
+import sys
+import logging
+import argparse
+import threading
+from datetime import date, datetime, time, timedelta
+
+import services
+import rollups
+from storage import load_households, household_scope, DEFAULT_HOUSEHOLD
+
+# ----------------------------------------------------------------------
+# BACKGROUND JOBS: NIGHTLY DAY FINALIZATION
+# ----------------------------------------------------------------------
+# Shortly after midnight every child of every household has the day that
+# just ended finalized (see rollups.py). The job runs either inside the app
+# process on a daemon thread (NAMAZ_SCHEDULER=1) or from the command line,
+# e.g. from cron. With NAMAZ_FILL_MISSED=1 (or --fill-missed) prayers that
+# were never marked are stored as Missed when their day is finalized.
+#
+#   python scheduler.py finalize --fill-missed
+#   python scheduler.py finalize --household 4a13eea6 --through 2025-11-30
+#   python scheduler.py run
+
+FINALIZE_AFTER_MIDNIGHT = timedelta(minutes=5)
+FILL_MISSED = os.environ.get('NAMAZ_FILL_MISSED') == '1'
+
+logger = logging.getLogger(__name__)
+
+
+def finalize_household(through=None, fill_missed=FILL_MISSED):
+    """Finalizes every child of the current household up to `through` (default: yesterday). Returns {child_id: days}."""
+    through = through or date.today() - timedelta(days=1)
+    return rollups.finalize_children([child['id'] for child in services.list_children()], through, fill_missed)
+
+
+def finalize_all(through=None, fill_missed=FILL_MISSED):
+    """
+    Finalizes every household. A failing household is logged and skipped so
+    it can't hold up the others. Returns {household_id: {child_id: days}}.
+    """
+    results = {}
+    for household_id in [DEFAULT_HOUSEHOLD] + sorted(load_households()):
+        try:
+            with household_scope(household_id):
+                results[household_id] = finalize_household(through, fill_missed)
+        except Exception:
+            logger.exception("Finalizing household %s failed", household_id)
+    return results
+
+
+def next_run(now):
+    """Returns when the nightly job is next due after `now`."""
+    due = datetime.combine(now.date(), time()) + FINALIZE_AFTER_MIDNIGHT
+    return due if due > now else due + timedelta(days=1)
+
+
+class BackgroundScheduler(threading.Thread):
+    """Runs finalize_all on start (catching up on missed nights) and then every night."""
+
+    def __init__(self, fill_missed=FILL_MISSED):
+        super().__init__(name='namaz-scheduler', daemon=True)
+        self.fill_missed = fill_missed
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            finalize_all(fill_missed=self.fill_missed)
+            now = datetime.now()
+            self._stopping.wait((next_run(now) - now).total_seconds())
+
+    def stop(self):
+        self._stopping.set()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def start_background(fill_missed=FILL_MISSED):
+    """Starts the process-wide scheduler thread on the first call; later calls return the same one."""
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = BackgroundScheduler(fill_missed)
+            _background.start()
+        return _background
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Namaz Tracker background jobs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    finalize_parser = subparsers.add_parser('finalize', help='Finalize the days that are over, once.')
+    finalize_parser.add_argument('--through', type=date.fromisoformat, help='Last day to finalize (default: yesterday).')
+    finalize_parser.add_argument('--household', help='Only this household (default: all).')
+    finalize_parser.add_argument('--fill-missed', action='store_true', default=FILL_MISSED,
+                                 help='Store unrecorded prayers as Missed.')
+
+    run_parser = subparsers.add_parser('run', help='Keep running and finalize every night.')
+    run_parser.add_argument('--fill-missed', action='store_true', default=FILL_MISSED)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.command == 'run':
+        scheduler = BackgroundScheduler(args.fill_missed)
+        scheduler.start()
+        try:
+            scheduler.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        if args.household:
+            if services.find_household(args.household) is None:
+                sys.exit(f"Unknown household: {args.household}")
+            with household_scope(args.household):
+                results = {args.household: finalize_household(args.through, args.fill_missed)}
+        else:
+            results = finalize_all(args.through, args.fill_missed)
+        for household_id, days_by_child in results.items():
+            print(f"{household_id}: finalized {sum(days_by_child.values())} days for {len(days_by_child)} children")
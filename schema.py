@@ -0,0 +1,198 @@
+import json
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from aggregates import PRAYER_NAMES
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ----------------------------------------------------------------------
+# STORED DATA SCHEMA
+# ----------------------------------------------------------------------
+# The shape of the documents the JSON backend stores:
+#
+#   users.json       {"parent_key_hash", "children": [{"id", "name", "pass_hash"}]}
+#   <shard>.json     {"YYYY-MM-DD": {prayer: record}} for one child,
+#                    record = {"is_prayed", "method", "time"} (see PrayerRecord)
+#
+# Loading checks every document against it. The cleaners don't build typed
+# objects (a child's history holds thousands of records); they check the
+# parsed dicts in place and return the valid part together with a list
+# of problems, so a single bad record can be quarantined instead of the
+# whole file being thrown away (see storage.py).
+#
+# Documents are parsed with orjson when it is installed (pip install orjson)
+# and with the standard json module otherwise.
+
+METHOD_NAMES = ("Masjid", "Alone", "Kaza", "Missed")
+RECORD_FIELDS = frozenset(("is_prayed", "method", "time"))
+
+_PRAYERS = frozenset(PRAYER_NAMES)
+_METHODS = frozenset(METHOD_NAMES) | {None}
+_OPTIONAL_BOOL = frozenset((bool, type(None)))
+_OPTIONAL_STR = frozenset((str, type(None)))
+
+
+class SchemaError(ValueError):
+    """Raised when a stored value doesn't match the schema."""
+
+
+def loads(data):
+    """Parses a JSON document (bytes or str) with the fastest parser available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parser_name():
+    """Returns the name of the JSON parser in use."""
+    return 'orjson' if orjson is not None else 'json'
+
+# ----------------------------------------------------------------------
+# CHECKS
+# ----------------------------------------------------------------------
+# Each returns None for a valid value, or a short reason why it isn't.
+
+def _is_optional(value, kind):
+    return value is None or isinstance(value, kind)
+
+
+def record_problem(raw):
+    """Checks one {is_prayed, method, time} record."""
+    if not isinstance(raw, dict):
+        return "record is not an object"
+    if not raw.keys() <= RECORD_FIELDS:
+        return f"unknown fields {sorted(raw.keys() - RECORD_FIELDS)}"
+    if not _is_optional(raw.get('is_prayed'), bool):
+        return "is_prayed is not a boolean"
+    if raw.get('method') not in _METHODS:
+        return f"unknown method {raw.get('method')!r}"
+    if not _is_optional(raw.get('time'), str):
+        return "time is not a string"
+    return None
+
+
+def date_problem(date_str):
+    """Checks a 'YYYY-MM-DD' date key."""
+    try:
+        if len(date_str) == 10 and date.fromisoformat(date_str):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return f"invalid date {date_str!r}"
+
+
+def event_problem(event):
+    """Checks one mark-log event (a record plus child_id, date and prayer)."""
+    if not isinstance(event.get('child_id'), str):
+        return "child_id is not a string"
+    if event.get('op') == 'delete_child':
+        return None
+    if event.get('prayer') not in _PRAYERS:
+        return f"unknown prayer {event.get('prayer')!r}"
+    return date_problem(event.get('date')) or record_problem(
+        {name: event.get(name) for name in RECORD_FIELDS})
+
+
+def child_problem(raw):
+    """Checks one child account of the user data."""
+    if not isinstance(raw, dict):
+        return "child is not an object"
+    if not isinstance(raw.get('id'), str) or not raw['id']:
+        return "child has no id"
+    if not isinstance(raw.get('name'), str):
+        return "child has no name"
+    # Profiles created before child passwords existed have neither field
+    for key in ('pass_hash', 'pass'):
+        if not _is_optional(raw.get(key), str):
+            return f"{key} is not a string"
+    return None
+
+# ----------------------------------------------------------------------
+# CLEANERS
+# ----------------------------------------------------------------------
+# Each takes a parsed document and returns (valid part, problems), where a
+# problem is {"at": [keys], "value": the rejected value, "reason": ...}.
+
+def _problem(at, value, reason):
+    return {"at": at, "value": value, "reason": reason}
+
+
+def clean_child_records(raw):
+    """Returns a child's {date: {prayer: record}} without the invalid days and records."""
+    if not isinstance(raw, dict):
+        return {}, [_problem([], raw, "records are not an object")]
+    problems = []
+    bad_days = []
+    for date_str, daily in raw.items():
+        reason = date_problem(date_str) or (None if isinstance(daily, dict) else "day is not an object")
+        if reason:
+            problems.append(_problem([date_str], daily, reason))
+            bad_days.append(date_str)
+            continue
+        bad_prayers = []
+        for prayer, record in daily.items():
+            # Inlined check for the common, valid case; record_problem explains the rest
+            if (type(record) is dict and record.keys() <= RECORD_FIELDS and prayer in _PRAYERS
+                    and type(record.get('is_prayed')) in _OPTIONAL_BOOL
+                    and record.get('method') in _METHODS and type(record.get('time')) in _OPTIONAL_STR):
+                continue
+            reason = (None if prayer in _PRAYERS else f"unknown prayer {prayer!r}") or record_problem(record)
+            if reason:
+                problems.append(_problem([date_str, prayer], record, reason))
+                bad_prayers.append(prayer)
+        for prayer in bad_prayers:
+            del daily[prayer]
+    for date_str in bad_days:
+        del raw[date_str]
+    return raw, problems
+
+
+def clean_user_data(raw):
+    """Returns the user data without invalid keys and child accounts (later duplicates of an id included)."""
+    if not isinstance(raw, dict):
+        return {}, [_problem([], raw, "user data is not an object")]
+    problems = []
+    for key in ('parent_key', 'parent_key_hash'):
+        if key in raw and not _is_optional(raw[key], str):
+            problems.append(_problem([key], raw.pop(key), f"{key} is not a string"))
+    children = raw.get('children', [])
+    if not isinstance(children, list):
+        problems.append(_problem(['children'], children, "children is not a list"))
+        children = []
+    valid, seen = [], set()
+    for n, child in enumerate(children):
+        reason = child_problem(child) or (f"duplicate child id {child['id']!r}" if child['id'] in seen else None)
+        if reason:
+            problems.append(_problem(['children', n], child, reason))
+            continue
+        seen.add(child['id'])
+        valid.append(child)
+    if 'children' in raw or valid:
+        raw['children'] = valid
+    return raw, problems
+
+# ----------------------------------------------------------------------
+# TYPED VIEWS
+# ----------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class PrayerRecord:
+    is_prayed: Optional[bool]
+    method: Optional[str]
+    time: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, raw):
+        """Builds a record from its stored dict. Raises SchemaError if it's invalid."""
+        reason = record_problem(raw)
+        if reason:
+            raise SchemaError(reason)
+        return cls(raw.get('is_prayed'), raw.get('method'), raw.get('time'))
+
+    def to_dict(self):
+        return {"is_prayed": self.is_prayed, "method": self.method, "time": self.time}
@@ -0,0 +1,398 @@
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import storage
+from storage import get_storage, current_household
+from profiling import profiled
+import aggregates
+from aggregates import PRAYER_NAMES, week_start
+from credentials import hash_secret, verify_secret, remember_verified, plaintext_matches, login_throttle
+import prayer_stats
+import rollups
+
+# ----------------------------------------------------------------------
+# SERVICE LAYER
+# ----------------------------------------------------------------------
+# Everything the app does to the data, without any Streamlit calls, so the
+# same functions back the UI, batch jobs and benchmarks. Invalid input
+# raises ValueError with a message fit to show the user.
+#
+# numpy (prayer_times) and pandas (analytics) are imported inside the
+# functions that need them, so pages that never show times or charts start
+# without paying for them.
+#
+# Every function works on the current household (see storage.py): the app
+# calls use_household() at the start of each rerun, the API wraps each
+# request in household_scope().
+#
+# Credentials are kept as salted hashes (see credentials.py). Records still
+# holding a plaintext `parent_key` or child `pass` are upgraded to
+# `parent_key_hash` / `pass_hash` the first time they log in successfully.
+
+MARK_METHODS = ["Masjid", "Alone", "Kaza", "Missed"]
+
+# A prayer counts as overdue (and is reminded about) this long after its time
+REMINDER_GRACE_MINUTES = int(os.environ.get('NAMAZ_REMINDER_GRACE', 20))
+
+
+# --- PRAYER TIMES ---
+
+def get_daily_prayer_times(for_date=None):
+    """
+    Returns the prayer times for a date (today in the schedule's time zone by
+    default), looked up from the precomputed yearly schedule for the
+    configured location and method.
+    """
+    from prayer_times import get_prayer_minutes, format_minutes, schedule_today
+
+    for_date = for_date or schedule_today()
+    minutes = get_prayer_minutes(for_date)
+    prayer_times = {"date": str(for_date)}
+    for name in PRAYER_NAMES:
+        prayer_times[name] = format_minutes(minutes[name])
+    return prayer_times
+
+
+def prayer_due_times(for_date=None, grace_minutes=REMINDER_GRACE_MINUTES):
+    """
+    Returns [(prayer, due)] for a date (today in the schedule's time zone by
+    default) in prayer order, where `due` is the aware datetime, in that
+    zone, `grace_minutes` after the prayer's time. Prayers without a defined
+    time are left out.
+    """
+    from prayer_times import get_prayer_minutes, schedule_today, schedule_zone
+
+    for_date = for_date or schedule_today()
+    midnight = datetime.combine(for_date, datetime.min.time(), schedule_zone())
+    minutes = get_prayer_minutes(for_date)
+    return [(name, midnight + timedelta(minutes=minutes[name] + grace_minutes))
+            for name in PRAYER_NAMES if minutes[name] >= 0]
+
+
+def overdue_prayers(child_id, now=None):
+    """
+    Returns the prayers of the schedule's current day (as of `now`, an
+    aware datetime, or naive in the schedule's zone) past due without any mark.
+    """
+    from prayer_times import schedule_now, in_schedule_zone
+
+    now = schedule_now() if now is None else in_schedule_zone(now)
+    records = day_records(child_id, now.date())
+    return [prayer for prayer, due in prayer_due_times(now.date())
+            if due <= now and not (records.get(prayer) or {}).get('method')]
+
+
+# --- MARKING PRAYERS ---
+
+@profiled('service')
+def day_records(child_id, for_date=None):
+    """Returns a child's {prayer: record} marks for a date (today by default)."""
+    return get_storage().load_day_records(child_id, str(for_date or date.today()))
+
+
+def make_record(prayer, method, time_str=None):
+    """
+    Validates one mark and returns its stored record. `method` is Masjid,
+    Alone or Kaza for a prayed prayer, or Missed; `time_str` ('HH:MM') is
+    only kept for prayed prayers.
+    """
+    if prayer not in PRAYER_NAMES:
+        raise ValueError(f"Unknown prayer: {prayer!r}")
+    if method not in MARK_METHODS:
+        raise ValueError(f"Unknown method: {method!r}")
+
+    is_prayed = method != 'Missed'
+    return {
+        "is_prayed": is_prayed,
+        "method": method,
+        "time": time_str if is_prayed else None
+    }
+
+
+@profiled('service')
+def record_prayer(child_id, prayer, method, for_date=None, at=None):
+    """
+    Saves (or overwrites) one prayer mark. The time of marking (`at`, now by
+    default) is kept for prayed prayers. Returns the saved record.
+    """
+    record = make_record(prayer, method, (at or datetime.now()).strftime("%H:%M"))
+    date_str = str(for_date or date.today())
+    get_storage().save_prayer_mark(child_id, date_str, prayer, record)
+    rollups.reopen(child_id, date_str)
+    return record
+
+
+@profiled('service')
+def record_day(child_id, methods_by_prayer, for_date=None, at=None):
+    """
+    Saves several prayers of one day at once from {prayer: method}. Every
+    mark is validated before anything is written, and they are all stored
+    with a single write. Returns {prayer: record}.
+    """
+    time_str = (at or datetime.now()).strftime("%H:%M")
+    records = {prayer: make_record(prayer, method, time_str) for prayer, method in methods_by_prayer.items()}
+    if records:
+        date_str = str(for_date or date.today())
+        record_marks([(child_id, date_str, prayer, record) for prayer, record in records.items()])
+    return records
+
+
+def record_marks(marks):
+    """
+    Stores already validated (child_id, date, prayer, record) marks in one
+    storage write, reopening any finalized days they change.
+    """
+    get_storage().save_prayer_marks(marks)
+    earliest = {}
+    for child_id, date_str, _, _ in marks:
+        earliest[child_id] = min(date_str, earliest.get(child_id, date_str))
+    for child_id, date_str in earliest.items():
+        rollups.reopen(child_id, date_str)
+
+
+# --- STATISTICS ---
+
+def has_records(child_id):
+    """Returns True if the child has marked at least one prayer."""
+    return get_storage().has_records(child_id)
+
+
+@profiled('service')
+def weekly_stats(child_id, today=None):
+    """
+    Returns this calendar week's counters (Monday up to `today`) for a child:
+    prayed, missed, on_time, kaza and methods, plus days_elapsed,
+    max_possible (5 per elapsed day) and completion as a percentage. The
+    week's finalized days come from the nightly rollup; only the days after
+    them are counted from the records.
+    """
+    today = today or date.today()
+    monday = week_start(str(today))
+    counters = aggregates.empty_counters()
+    live_since = monday
+    finalized = rollups.week_counters(child_id, monday)
+    if finalized is not None:
+        week, finalized_through = finalized
+        aggregates.add_counters(counters, week)
+        live_since = str(date.fromisoformat(finalized_through) + timedelta(days=1))
+    live = get_storage().load_child_derived(
+        child_id, 'week_counters', lambda records: aggregates.build_child_aggregates(records)['total'],
+        live_since, today)
+    aggregates.add_counters(counters, live)
+    days_elapsed = today.weekday() + 1
+    max_possible = 5 * days_elapsed
+    return dict(counters, days_elapsed=days_elapsed, max_possible=max_possible,
+                completion=counters['prayed'] / max_possible * 100)
+
+
+@profiled('service')
+def long_range_stats(child_id, today=None, months=12):
+    """
+    Returns a child's whole-history statistics: current and longest streak
+    of complete days, per-prayer consistency rows and a month-over-month
+    trend over the last `months` months. Finalized days come from the
+    nightly rollup and only later records are scanned; without a rollup the
+    whole history is, once per data version.
+    """
+    today = today or date.today()
+    rollup = rollups.get_rollup(child_id)
+    if rollup is not None and rollup['stats'] is not None:
+        since = date.fromisoformat(rollup['finalized_through']) + timedelta(days=1)
+        stats = get_storage().load_child_derived(
+            child_id, 'prayer_stats_live',
+            lambda live_records: prayer_stats.build_prayer_stats(live_records, rollup['stats']),
+            since, None)
+    else:
+        stats = get_storage().load_child_derived(child_id, 'prayer_stats', prayer_stats.build_prayer_stats)
+    return {
+        "finalized_through": None if rollup is None else rollup['finalized_through'],
+        "current_streak": prayer_stats.current_streak(stats, today),
+        "longest_streak": stats['longest_streak'],
+        "longest_streak_end": stats['longest_streak_end'],
+        "prayers": prayer_stats.prayer_consistency(stats),
+        "months": prayer_stats.monthly_trend(stats, months, today),
+    }
+
+
+@profiled('service')
+def method_breakdown(child_id, start=None, end=None):
+    """Counts each method used in the start..end window, most frequent first."""
+    import analytics
+    return analytics.method_summary(analytics.load_child_frame(child_id, start, end))
+
+
+@profiled('service')
+def household_comparison(children, start=None, end=None, today=None):
+    """
+    Returns one row per child, indexed by name: this week's completion
+    followed by prayed, missed and per-method counts over start..end. Both
+    come from a single household frame spanning the window and this week.
+    """
+    import analytics
+    today = today or date.today()
+    monday = date.fromisoformat(week_start(str(today)))
+    child_ids = [child['id'] for child in children]
+    frame_start = None if start is None else min(date.fromisoformat(str(start)), monday)
+    frame_end = None if end is None else max(date.fromisoformat(str(end)), today)
+    frame = analytics.load_household_frame(child_ids, frame_start, frame_end)
+    summary = analytics.household_summary(analytics.date_window(frame, start, end))
+    completion = analytics.weekly_completion(frame, monday, today)
+    summary.insert(0, 'Weekly Completion (%)', completion.loc[summary.index].round(1).to_numpy())
+    summary.index = [child['name'] for child in children]
+    summary.index.name = 'Child'
+    return summary
+
+
+# --- HOUSEHOLDS ---
+
+def use_household(household_id):
+    """Scopes the rest of this rerun to a household."""
+    storage.set_current_household(household_id)
+
+
+def find_household(household_id):
+    """Returns {"id", "name"} for a household code, or None if there is no such household."""
+    household_id = (household_id or '').strip()
+    if not household_id:
+        return None
+    household = storage.get_household(household_id)
+    return None if household is None else {"id": household_id, "name": household['name']}
+
+
+@profiled('service')
+def create_household(name):
+    """Registers a new household (family) and returns {"id", "name"}; the id is its login code."""
+    name = name.strip()
+    if not name:
+        raise ValueError("Please enter a name for the household.")
+    return {"id": storage.create_household(name), "name": name}
+
+
+# --- ACCOUNTS ---
+
+def list_children():
+    """Returns the registered children as [{"name", "id", ...}]."""
+    return get_storage().load_user_data().get('children', [])
+
+
+def _index_children(data):
+    return {child['id']: child for child in data.get('children', [])}
+
+
+def find_child(child_id):
+    """Returns a child's stored profile by id (an indexed lookup), or None."""
+    return get_storage().load_user_derived('children_by_id', _index_children).get(child_id)
+
+
+def has_parent_key():
+    """Returns True once the parent has set a secret key."""
+    data = get_storage().load_user_data()
+    return bool(data.get('parent_key_hash') or data.get('parent_key'))
+
+
+def set_parent_key(key):
+    """Sets the parent's 4-digit secret key (stored hashed), keeping any existing children."""
+    if len(key) != 4 or not key.isdigit():
+        raise ValueError('Please enter a valid 4-digit key.')
+
+    hashed = hash_secret(key)
+    def apply(data):
+        data['parent_key_hash'] = hashed
+        data.pop('parent_key', None)
+        data.setdefault('children', [])
+    get_storage().update_user_data(apply)
+
+
+def _throttled_check(identity, verify):
+    """Runs `verify()` unless the identity is locked out, recording the outcome."""
+    login_throttle.check(identity)
+    if verify():
+        login_throttle.success(identity)
+        return True
+    login_throttle.failure(identity)
+    return False
+
+
+def check_parent_key(key):
+    """
+    Returns True if `key` matches the parent's secret key. Raises
+    TooManyAttempts while the household's parent login is locked out.
+    """
+    data = get_storage().load_user_data()
+    # An empty key isn't an attempt (e.g. an API call without the header)
+    if not key or not (data.get('parent_key_hash') or data.get('parent_key')):
+        return False
+
+    def verify():
+        if data.get('parent_key_hash'):
+            return verify_secret(key, data['parent_key_hash'])
+        if not plaintext_matches(key, data.get('parent_key')):
+            return False
+        hashed = hash_secret(key)
+        remember_verified(key, hashed)
+        def upgrade(fresh):
+            if fresh.get('parent_key') == key:
+                fresh['parent_key_hash'] = hashed
+                del fresh['parent_key']
+        get_storage().update_user_data(upgrade)
+        return True
+    return _throttled_check(f"{current_household()}:parent", verify)
+
+
+def authenticate_child(child_id, child_pass):
+    """
+    Returns True if the password matches the child with this id, looked up
+    through an index so the cost doesn't grow with the number of children.
+    Raises TooManyAttempts while that child's login is locked out.
+    """
+    child = find_child(child_id)
+    if child is None or not child_pass:
+        return False
+
+    def verify():
+        if child.get('pass_hash'):
+            return verify_secret(child_pass, child['pass_hash'])
+        if not plaintext_matches(child_pass, child.get('pass')):
+            return False
+        hashed = hash_secret(child_pass)
+        remember_verified(child_pass, hashed)
+        def upgrade(data):
+            for stored in data.get('children', []):
+                if stored['id'] == child_id and stored.get('pass') == child_pass:
+                    stored['pass_hash'] = hashed
+                    del stored['pass']
+        get_storage().update_user_data(upgrade)
+        return True
+    return _throttled_check(f"{current_household()}:child:{child_id}", verify)
+
+
+@profiled('service')
+def add_child(name, password):
+    """
+    Registers a new child with a fresh 8-character login ID, merged into the
+    latest stored data so concurrent edits are kept. Returns the new child.
+    """
+    name = name.strip()
+    if not name:
+        raise ValueError("Please enter a name for the child.")
+    if not password:
+        raise ValueError("Please enter a password for the child.")
+
+    new_child = {"name": name, "id": str(uuid.uuid4())[:8], "pass_hash": hash_secret(password)}
+    get_storage().update_user_data(lambda data: data.setdefault('children', []).append(new_child))
+    return new_child
+
+
+@profiled('service')
+def delete_child(child_id):
+    """
+    Removes a child's profile and all of their prayer records. Returns True
+    if any prayer records existed.
+    """
+    def remove_child(data):
+        data['children'] = [child for child in data.get('children', []) if child['id'] != child_id]
+    household_storage = get_storage()
+    household_storage.update_user_data(remove_child)
+    rollups.forget(child_id)
+    return household_storage.delete_child_records(child_id)
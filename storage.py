@@ -0,0 +1,1142 @@
+import re
+import glob
+import json
+import os
+import uuid
+import shutil
+import logging
+import sqlite3
+import hashlib
+import bisect
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+
+import cache
+import schema
+from profiling import profiled
+import compact_records
+from locking import file_lock, atomic_write_json, BACKUP_SUFFIX
+
+# --- FILE CONFIGURATION ---
+USER_FILE = 'users.json'
+PRAYER_RECORDS_FILE = 'namaz_records.json'  # Legacy single-file records, migrated on first use
+PRAYER_RECORDS_DIR = 'namaz_records'
+MANIFEST_FILE = 'manifest.json'
+SQLITE_DB_FILE = 'namaz_tracker.db'
+ROLLUPS_FILE = 'rollups.json'
+HOUSEHOLDS_FILE = 'households.json'
+HOUSEHOLDS_DIR = 'households'
+QUARANTINE_SUFFIX = '.quarantine.log'
+
+SAFE_SHARD_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# A child's mark log is folded into its snapshot once it grows past this size
+LOG_COMPACT_BYTES = int(os.environ.get('NAMAZ_LOG_COMPACT_BYTES', 256 * 1024))
+
+# Selects the storage engine: 'json' (default) or 'sqlite'
+STORAGE_BACKEND = os.environ.get('NAMAZ_STORAGE', 'json')
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------------
+# APPEND-ONLY MARK LOG
+# ----------------------------------------------------------------------
+# Each mark is one JSON line: the record fields plus child_id, date and
+# prayer. Readers replay the log over the last snapshot; compaction moves
+# folded lines to an audit log. Deleting a child removes all of their
+# files, the audit log included. (Logs written before records were sharded
+# may still hold {"op": "delete_child", ...} events.)
+
+def append_log_events(log_file, events):
+    """Appends event lines to the log with a single write and flushes them to disk."""
+    logged_at = datetime.now().isoformat(timespec='seconds')
+    lines = ''.join(json.dumps(dict(event, logged_at=logged_at)) + '\n' for event in events)
+    with open(log_file, 'a+') as f:
+        # Terminate a torn line left by a crash so it cannot swallow these events
+        if f.tell() > 0:
+            f.seek(f.tell() - 1)
+            if f.read(1) != '\n':
+                lines = '\n' + lines
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def append_log_event(log_file, event):
+    """Appends one event line to the log and flushes it to disk."""
+    append_log_events(log_file, [event])
+
+
+def read_log_events(log_file):
+    """Yields the events of a log file, skipping torn lines left by a crash."""
+    if not os.path.exists(log_file):
+        return
+    with open(log_file, 'r') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                continue
+            try:
+                yield schema.loads(line)
+            except ValueError:
+                continue
+
+
+def apply_log_event(records, event):
+    """Applies a single log event to a nested records dict in place."""
+    child_id = event.get('child_id')
+    if event.get('op') == 'delete_child':
+        records.pop(child_id, None)
+        return
+    records.setdefault(child_id, {}).setdefault(event['date'], {})[event['prayer']] = {
+        "is_prayed": event.get('is_prayed'),
+        "method": event.get('method'),
+        "time": event.get('time')
+    }
+
+
+def archive_log(log_file, audit_file):
+    """Moves the contents of a folded log onto the end of the audit trail."""
+    if not os.path.exists(log_file):
+        return
+    with open(log_file, 'r') as src, open(audit_file, 'a') as dst:
+        for line in src:
+            if line.endswith('\n') and line.strip():
+                dst.write(line)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.remove(log_file)
+
+# ----------------------------------------------------------------------
+# DATE WINDOWS
+# ----------------------------------------------------------------------
+
+def date_bound(value):
+    """Normalizes a date, 'YYYY-MM-DD' string or None into a comparable string bound."""
+    return None if value is None else str(value)
+
+
+def slice_dates(child_records, sorted_dates, start=None, end=None):
+    """Returns the {date: records} entries with start <= date <= end using a sorted date index."""
+    lo = 0 if start is None else bisect.bisect_left(sorted_dates, start)
+    hi = len(sorted_dates) if end is None else bisect.bisect_right(sorted_dates, end)
+    return {date_str: child_records[date_str] for date_str in sorted_dates[lo:hi]}
+
+# ----------------------------------------------------------------------
+# VALIDATED LOADING AND RECOVERY
+# ----------------------------------------------------------------------
+# Documents are written together with a last-known-good copy
+# (path + BACKUP_SUFFIX). A document that no longer parses is replaced by
+# that copy, keeping the damaged file next to it for inspection, instead of
+# being read as empty and overwritten on the next save. Parsed documents are
+# checked against the schema (see schema.py): invalid records are moved one
+# by one to path + QUARANTINE_SUFFIX, as JSON lines, and the rest is kept.
+# Repairs write the document, so they only happen under its exclusive lock:
+# a reader holding the shared lock gets RepairNeeded and retries exclusively.
+
+class CorruptDataError(Exception):
+    """Raised when a document can't be parsed and there is no good copy to restore."""
+
+
+class RepairNeeded(Exception):
+    """Raised by load_document(..., repair=False) when the document has to be restored or cleaned."""
+
+
+def _parse_file(path):
+    """Returns the parsed document, or None for an empty file. Raises ValueError if it doesn't parse."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return schema.loads(raw) if raw.strip() else None
+
+
+def _restore_backup(path, error):
+    """Puts the last-known-good copy of a damaged document back in place and returns it."""
+    backup = path + BACKUP_SUFFIX
+    try:
+        data = _parse_file(backup) if os.path.exists(backup) else None
+    except ValueError:
+        data = None
+    if data is None:
+        raise CorruptDataError(f"{path} is damaged ({error}) and there is no good copy to restore")
+    damaged = f"{path}.damaged-{datetime.now():%Y%m%d-%H%M%S-%f}"
+    shutil.copyfile(path, damaged)
+    atomic_write_json(path, data)
+    logger.error("%s was damaged (%s); restored the last good copy, damaged file kept as %s",
+                 path, error, damaged)
+    return data
+
+
+def quarantine(path, problems):
+    """Appends rejected values (see schema.py cleaners) to the document's quarantine log."""
+    append_log_events(path + QUARANTINE_SUFFIX, problems)
+    logger.warning("Quarantined %d invalid entries of %s", len(problems), path)
+
+
+def load_document(path, clean=None, repair=True):
+    """
+    Loads a JSON document, {} if the file is missing or empty. A damaged
+    document is restored from its last-known-good copy (CorruptDataError if
+    there is none). With `clean`, a schema cleaner, invalid entries are
+    quarantined and the document is rewritten without them. The caller must
+    hold the document's exclusive lock unless `repair` is False, in which
+    case RepairNeeded is raised instead of touching the file.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        data = _parse_file(path)
+        if data is None and os.path.exists(path + BACKUP_SUFFIX):
+            raise ValueError("the file is empty")
+    except ValueError as error:  # json's and orjson's decode errors, bad UTF-8
+        if not repair:
+            raise RepairNeeded(path)
+        data = _restore_backup(path, error)
+    if data is None:
+        return {}
+    if clean is not None:
+        data, problems = clean(data)
+        if problems:
+            if not repair:
+                raise RepairNeeded(path)
+            quarantine(path, problems)
+            atomic_write_json(path, data, backup=True)
+    return data
+
+
+def read_shared(lock_path, read):
+    """
+    Returns read(repair=False) under a shared lock on `lock_path`, or, if
+    the document needs repairing, read(repair=True) under an exclusive one.
+    """
+    try:
+        with file_lock(lock_path, shared=True):
+            return read(repair=False)
+    except RepairNeeded:
+        with file_lock(lock_path):
+            return read(repair=True)
+
+# ----------------------------------------------------------------------
+# JSON FILE BACKEND (SHARDED PER CHILD)
+# ----------------------------------------------------------------------
+
+def shard_name(child_id):
+    """Returns a filesystem-safe shard name for a child id."""
+    if SAFE_SHARD_NAME.match(child_id):
+        return child_id
+    return 'child-' + hashlib.sha1(child_id.encode('utf-8')).hexdigest()[:16]
+
+
+class JsonStorage:
+    """
+    Stores users as a JSON document and prayer records as one shard per
+    child under PRAYER_RECORDS_DIR: a JSON snapshot plus an append-only log
+    of marks, listed in a small manifest. Reading or marking a child's
+    prayers only touches that child's files, and recording a prayer costs
+    one appended line no matter how much history exists.
+    """
+
+    # Day and date-range reads have to parse the child's shard anyway
+    indexed_reads = False
+
+    def __init__(self, user_file=USER_FILE, records_dir=PRAYER_RECORDS_DIR,
+                 legacy_records_file=PRAYER_RECORDS_FILE):
+        self.user_file = user_file
+        self.records_dir = records_dir
+        self.manifest_file = os.path.join(records_dir, MANIFEST_FILE)
+        os.makedirs(records_dir, exist_ok=True)
+        self._migrate_legacy(legacy_records_file)
+
+    def _shard_paths(self, child_id):
+        base = os.path.join(self.records_dir, shard_name(child_id))
+        return base + '.json', base + '.log', base + '.audit.log'
+
+    def signature(self, kind, child_id=None):
+        """Returns a value that changes whenever the user file, one child's shard or any shard changes."""
+        if kind == 'users':
+            return cache.file_signature(self.user_file)
+        if child_id is not None:
+            snapshot, log, _ = self._shard_paths(child_id)
+            return cache.file_signature(snapshot, log)
+        with os.scandir(self.records_dir) as entries:
+            return tuple(sorted(
+                (entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in entries
+                if not entry.name.endswith(('.lock', '.tmp', BACKUP_SUFFIX, QUARANTINE_SUFFIX))
+            ))
+
+    @profiled('io', 'json_parse')
+    def _load(self, path, clean=None, repair=True):
+        return load_document(path, clean, repair)
+
+    # --- Manifest ---
+
+    def _read_manifest(self, repair=True):
+        # Caller holds the manifest lock (exclusive unless `repair` is False)
+        return self._load(self.manifest_file, repair=repair).get('children', {})
+
+    def _write_manifest(self, children):
+        atomic_write_json(self.manifest_file, {"version": 1, "children": children}, backup=True)
+
+    def _migrate_legacy(self, legacy_records_file):
+        """Splits the old single-file records (plus its mark log) into shards, once."""
+        if os.path.exists(self.manifest_file):
+            return
+        with file_lock(self.manifest_file):
+            if os.path.exists(self.manifest_file):
+                return
+            legacy = self._load(legacy_records_file)
+            legacy_log = os.path.splitext(legacy_records_file)[0] + '.log'
+            for event in read_log_events(legacy_log):
+                apply_log_event(legacy, event)
+            for child_id, child_records in legacy.items():
+                with file_lock(self._shard_paths(child_id)[0]):
+                    self._write_child(child_id, child_records)
+            self._write_manifest({child_id: {"shard": shard_name(child_id)} for child_id in legacy})
+
+    def child_ids(self):
+        """Returns the ids of every child with stored records."""
+        return list(read_shared(self.manifest_file, self._read_manifest))
+
+    # --- Per-child shards (caller holds the shard lock, exclusive unless `repair` is False) ---
+
+    def _read_child(self, child_id, repair=True):
+        snapshot, log, _ = self._shard_paths(child_id)
+        records = {child_id: self._load(snapshot, schema.clean_child_records, repair)}
+        for event in read_log_events(log):
+            reason = schema.event_problem(event)
+            if reason:
+                # The line stays in the log (and moves to the audit trail on compaction)
+                logger.warning("Skipping an invalid mark in %s: %s", log, reason)
+                continue
+            apply_log_event(records, event)
+        return records.get(child_id, {})
+
+    def _write_child(self, child_id, child_records):
+        snapshot, log, audit = self._shard_paths(child_id)
+        atomic_write_json(snapshot, child_records, backup=True)
+        archive_log(log, audit)
+
+    def _delete_child(self, child_id):
+        # Every copy of the child's marks goes: snapshot, backup, logs, quarantined and damaged files
+        snapshot, log, audit = self._shard_paths(child_id)
+        paths = [snapshot, snapshot + BACKUP_SUFFIX, snapshot + QUARANTINE_SUFFIX, log, audit]
+        for path in paths + glob.glob(glob.escape(snapshot) + '.damaged-*'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _append(self, child_id, events):
+        _, log, _ = self._shard_paths(child_id)
+        append_log_events(log, events)
+        if os.path.getsize(log) > LOG_COMPACT_BYTES:
+            self._write_child(child_id, self._read_child(child_id))
+
+    # --- Users ---
+
+    def load_user_data(self):
+        """Loads user data (key and children) from the JSON file."""
+        return read_shared(self.user_file,
+                           lambda repair: self._load(self.user_file, schema.clean_user_data, repair))
+
+    def save_user_data(self, data):
+        """Atomically replaces the user data file."""
+        with file_lock(self.user_file):
+            atomic_write_json(self.user_file, data, backup=True)
+
+    def update_user_data(self, mutator):
+        """
+        Applies `mutator(data)` to the freshest user data under an exclusive
+        lock and saves the result, so concurrent sessions never clobber each other.
+        """
+        with file_lock(self.user_file):
+            data = self._load(self.user_file, schema.clean_user_data)
+            result = mutator(data)
+            atomic_write_json(self.user_file, data, backup=True)
+            return result
+
+    # --- Records ---
+
+    def load_prayer_records(self):
+        """Loads every child's shard into the nested {child: {date: {prayer: record}}} dict."""
+        records = {}
+        for child_id in self.child_ids():
+            child_records = self.load_child_records(child_id)
+            if child_records:
+                records[child_id] = child_records
+        return records
+
+    def _replace_all(self, records):
+        # Caller holds the manifest lock
+        for child_id in self._read_manifest():
+            if child_id not in records:
+                with file_lock(self._shard_paths(child_id)[0]):
+                    self._delete_child(child_id)
+        for child_id, child_records in records.items():
+            with file_lock(self._shard_paths(child_id)[0]):
+                self._write_child(child_id, child_records)
+        self._write_manifest({child_id: {"shard": shard_name(child_id)} for child_id in records})
+
+    def save_prayer_records(self, records):
+        """Rewrites every shard from the nested records dict; children not in it are removed."""
+        with file_lock(self.manifest_file):
+            self._replace_all(records)
+
+    def update_prayer_records(self, mutator):
+        """Applies `mutator(records)` to the freshest records under the manifest lock and saves them."""
+        with file_lock(self.manifest_file):
+            records = {}
+            for child_id in self._read_manifest():
+                with file_lock(self._shard_paths(child_id)[0]):
+                    records[child_id] = self._read_child(child_id)
+            result = mutator(records)
+            self._replace_all(records)
+            return result
+
+    def compact(self):
+        """Folds every child's mark log into its snapshot and moves the log to the audit trail."""
+        for child_id in self.child_ids():
+            snapshot, log, _ = self._shard_paths(child_id)
+            with file_lock(snapshot):
+                if os.path.exists(log):
+                    self._write_child(child_id, self._read_child(child_id))
+
+    def load_child_records(self, child_id):
+        """Loads every date's records for a single child from its shard."""
+        snapshot, log, _ = self._shard_paths(child_id)
+        if not os.path.exists(snapshot) and not os.path.exists(log):
+            return {}
+        return read_shared(snapshot, lambda repair: self._read_child(child_id, repair))
+
+    def has_records(self, child_id):
+        """Returns True if the child's shard holds any mark, from file sizes alone (no parsing)."""
+        snapshot, log, _ = self._shard_paths(child_id)
+        return any(os.path.exists(path) and os.path.getsize(path) > len('{}') for path in (snapshot, log))
+
+    def load_day_records(self, child_id, date_str):
+        """Loads the records of one child for one date."""
+        return self.load_child_records(child_id).get(date_str, {})
+
+    def get_records(self, child_id, start=None, end=None):
+        """Loads one child's records with start <= date <= end (either bound may be None)."""
+        child_records = self.load_child_records(child_id)
+        return slice_dates(child_records, sorted(child_records), date_bound(start), date_bound(end))
+
+    def get_records_many(self, child_ids, start=None, end=None):
+        """Loads the start..end window for several children as {child_id: records}."""
+        return {child_id: self.get_records(child_id, start, end) for child_id in child_ids}
+
+    def save_prayer_mark(self, child_id, date_str, prayer, record):
+        """
+        Stores (or overwrites) the record of a single prayer by appending it to
+        the child's log. Returns the child's signature just before and just
+        after the write, both taken under the shard lock.
+        """
+        snapshot, log, _ = self._shard_paths(child_id)
+        event = dict(record, child_id=child_id, date=date_str, prayer=prayer)
+        with file_lock(snapshot):
+            if os.path.exists(snapshot) or os.path.exists(log):
+                before = self.signature('records', child_id)
+                self._append(child_id, [event])
+                return before, self.signature('records', child_id)
+        # First mark for this child: register the shard in the manifest
+        with file_lock(self.manifest_file):
+            manifest = self._read_manifest()
+            if child_id not in manifest:
+                manifest[child_id] = {"shard": shard_name(child_id)}
+                self._write_manifest(manifest)
+            with file_lock(snapshot):
+                before = self.signature('records', child_id)
+                self._append(child_id, [event])
+                return before, self.signature('records', child_id)
+
+    def save_prayer_marks(self, marks):
+        """
+        Stores many (child_id, date, prayer, record) marks at once. Children
+        seen for the first time are registered in the manifest together, and
+        each child's marks are appended to its log in a single write, so a
+        batch costs one write per child instead of one per mark. Returns
+        {child_id: (before, after)} signatures taken under the shard locks.
+        """
+        events_by_child = {}
+        for child_id, date_str, prayer, record in marks:
+            events_by_child.setdefault(child_id, []).append(
+                dict(record, child_id=child_id, date=date_str, prayer=prayer))
+
+        with file_lock(self.manifest_file):
+            manifest = self._read_manifest()
+            new_children = [child_id for child_id in events_by_child if child_id not in manifest]
+            if new_children:
+                manifest.update({child_id: {"shard": shard_name(child_id)} for child_id in new_children})
+                self._write_manifest(manifest)
+
+        signatures = {}
+        for child_id, events in events_by_child.items():
+            with file_lock(self._shard_paths(child_id)[0]):
+                before = self.signature('records', child_id)
+                self._append(child_id, events)
+                signatures[child_id] = (before, self.signature('records', child_id))
+        return signatures
+
+    def delete_child_records(self, child_id):
+        """Unlinks a child's shard. Returns True if anything was deleted."""
+        with file_lock(self.manifest_file):
+            manifest = self._read_manifest()
+            if child_id not in manifest:
+                return False
+            with file_lock(self._shard_paths(child_id)[0]):
+                self._delete_child(child_id)
+            del manifest[child_id]
+            self._write_manifest(manifest)
+            return True
+
+# ----------------------------------------------------------------------
+# SQLITE BACKEND
+# ----------------------------------------------------------------------
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS children (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prayer_records (
+    child_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    prayer TEXT NOT NULL,
+    is_prayed INTEGER,
+    method TEXT,
+    time TEXT,
+    PRIMARY KEY (child_id, date, prayer)
+);
+CREATE INDEX IF NOT EXISTS idx_prayer_records_child_date
+    ON prayer_records (child_id, date);
+CREATE TABLE IF NOT EXISTS child_versions (
+    child_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+BUMP_VERSION_SQL = """
+INSERT INTO child_versions (child_id, version) VALUES (?, 1)
+ON CONFLICT (child_id) DO UPDATE SET version = version + 1
+"""
+
+UPSERT_MARK_SQL = """
+INSERT INTO prayer_records (child_id, date, prayer, is_prayed, method, time)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (child_id, date, prayer) DO UPDATE SET
+    is_prayed = excluded.is_prayed,
+    method = excluded.method,
+    time = excluded.time
+"""
+
+
+def _record_to_row(child_id, date_str, prayer, record):
+    is_prayed = record.get('is_prayed')
+    return (
+        child_id, date_str, prayer,
+        None if is_prayed is None else int(is_prayed),
+        record.get('method'),
+        record.get('time'),
+    )
+
+
+def _row_to_record(is_prayed, method, time_str):
+    return {
+        "is_prayed": None if is_prayed is None else bool(is_prayed),
+        "method": method,
+        "time": time_str
+    }
+
+
+class SqliteStorage:
+    """
+    Stores prayer records one row per (child, date, prayer) so a mark is a
+    single-row upsert and reading a day only touches that day's rows.
+    """
+
+    indexed_reads = True
+
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.db_file = db_file
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SQLITE_SCHEMA)
+
+    def signature(self, kind, child_id=None):
+        """
+        Returns a value that changes whenever the database (or its WAL) is
+        written, or, for one child, whenever that child's records change.
+        """
+        if child_id is None:
+            return cache.file_signature(self.db_file, self.db_file + '-wal')
+        with self._connect() as conn:
+            return self._child_version(conn, child_id)
+
+    def _child_version(self, conn, child_id):
+        row = conn.execute(
+            'SELECT version FROM child_versions WHERE child_id = ?', (child_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    @contextmanager
+    def _connect(self, immediate=False):
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with conn:
+                if immediate:
+                    # Take the write lock up front for read-modify-write transactions
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+        finally:
+            conn.close()
+
+    def _read_user_data(self, conn):
+        settings = conn.execute('SELECT key, value FROM settings').fetchall()
+        children = conn.execute('SELECT data FROM children ORDER BY position').fetchall()
+
+        if not settings and not children:
+            return {}
+
+        data = {key: json.loads(value) for key, value in settings}
+        data['children'] = [json.loads(row[0]) for row in children]
+        return data
+
+    def _write_user_data(self, conn, data):
+        conn.execute('DELETE FROM settings')
+        conn.execute('DELETE FROM children')
+        conn.executemany(
+            'INSERT INTO settings (key, value) VALUES (?, ?)',
+            [(key, json.dumps(value)) for key, value in data.items() if key != 'children']
+        )
+        conn.executemany(
+            'INSERT INTO children (id, position, data) VALUES (?, ?, ?)',
+            [(child['id'], position, json.dumps(child))
+             for position, child in enumerate(data.get('children', []))]
+        )
+
+    def load_user_data(self):
+        """Loads user data (key and children) from the database."""
+        with self._connect() as conn:
+            return self._read_user_data(conn)
+
+    def save_user_data(self, data):
+        """Replaces the stored user data with the given document."""
+        with self._connect() as conn:
+            self._write_user_data(conn, data)
+
+    def update_user_data(self, mutator):
+        """Applies `mutator(data)` to the freshest user data inside one write transaction."""
+        with self._connect(immediate=True) as conn:
+            data = self._read_user_data(conn)
+            result = mutator(data)
+            self._write_user_data(conn, data)
+            return result
+
+    def _read_records(self, conn):
+        records = {}
+        rows = conn.execute(
+            'SELECT child_id, date, prayer, is_prayed, method, time FROM prayer_records'
+        )
+        for child_id, date_str, prayer, is_prayed, method, time_str in rows:
+            records.setdefault(child_id, {}).setdefault(date_str, {})[prayer] = \
+                _row_to_record(is_prayed, method, time_str)
+        return records
+
+    def _write_records(self, conn, records):
+        rows = [
+            _record_to_row(child_id, date_str, prayer, record)
+            for child_id, child_records in records.items()
+            for date_str, daily in child_records.items()
+            for prayer, record in daily.items()
+            if record
+        ]
+        touched = {row[0] for row in conn.execute('SELECT DISTINCT child_id FROM prayer_records')}
+        touched.update(records)
+        conn.execute('DELETE FROM prayer_records')
+        conn.executemany(UPSERT_MARK_SQL, rows)
+        conn.executemany(BUMP_VERSION_SQL, [(child_id,) for child_id in touched])
+
+    def load_prayer_records(self):
+        """Loads all prayer records as the nested {child: {date: {prayer: record}}} dict."""
+        with self._connect() as conn:
+            return self._read_records(conn)
+
+    def save_prayer_records(self, records):
+        """Replaces every stored prayer record with the given nested dict."""
+        with self._connect() as conn:
+            self._write_records(conn, records)
+
+    def update_prayer_records(self, mutator):
+        """Applies `mutator(records)` to the freshest records inside one write transaction."""
+        with self._connect(immediate=True) as conn:
+            records = self._read_records(conn)
+            result = mutator(records)
+            self._write_records(conn, records)
+            return result
+
+    def load_child_records(self, child_id):
+        """Loads every date's records for a single child using the (child_id, date) index."""
+        child_records = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT date, prayer, is_prayed, method, time FROM prayer_records '
+                'WHERE child_id = ? ORDER BY date',
+                (child_id,)
+            )
+            for date_str, prayer, is_prayed, method, time_str in rows:
+                child_records.setdefault(date_str, {})[prayer] = \
+                    _row_to_record(is_prayed, method, time_str)
+        return child_records
+
+    def has_records(self, child_id):
+        """Returns True if the child has any mark, with a single indexed lookup."""
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM prayer_records WHERE child_id = ? LIMIT 1',
+                                (child_id,)).fetchone() is not None
+
+    def load_day_records(self, child_id, date_str):
+        """Loads the records of one child for one date."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT prayer, is_prayed, method, time FROM prayer_records '
+                'WHERE child_id = ? AND date = ?',
+                (child_id, date_str)
+            )
+            return {prayer: _row_to_record(is_prayed, method, time_str)
+                    for prayer, is_prayed, method, time_str in rows}
+
+    def get_records(self, child_id, start=None, end=None):
+        """Loads one child's records with start <= date <= end through the (child_id, date) index."""
+        child_records = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT date, prayer, is_prayed, method, time FROM prayer_records '
+                'WHERE child_id = ? AND date >= ? AND date <= ? ORDER BY date',
+                (child_id, date_bound(start) or '', date_bound(end) or '9999-12-31')
+            )
+            for date_str, prayer, is_prayed, method, time_str in rows:
+                child_records.setdefault(date_str, {})[prayer] = \
+                    _row_to_record(is_prayed, method, time_str)
+        return child_records
+
+    def get_records_many(self, child_ids, start=None, end=None):
+        """Loads the start..end window for several children in one indexed query."""
+        child_ids = list(child_ids)
+        records = {child_id: {} for child_id in child_ids}
+        if not child_ids:
+            return records
+        placeholders = ', '.join('?' * len(child_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT child_id, date, prayer, is_prayed, method, time FROM prayer_records '
+                f'WHERE child_id IN ({placeholders}) AND date >= ? AND date <= ?',
+                child_ids + [date_bound(start) or '', date_bound(end) or '9999-12-31']
+            )
+            for child_id, date_str, prayer, is_prayed, method, time_str in rows:
+                records[child_id].setdefault(date_str, {})[prayer] = \
+                    _row_to_record(is_prayed, method, time_str)
+        return records
+
+    def save_prayer_mark(self, child_id, date_str, prayer, record):
+        """
+        Upserts the record of a single prayer. Returns the child's version
+        just before and just after the write, both read inside the transaction.
+        """
+        with self._connect(immediate=True) as conn:
+            before = self._child_version(conn, child_id)
+            conn.execute(UPSERT_MARK_SQL, _record_to_row(child_id, date_str, prayer, record))
+            conn.execute(BUMP_VERSION_SQL, (child_id,))
+            return before, self._child_version(conn, child_id)
+
+    def save_prayer_marks(self, marks):
+        """
+        Upserts many (child_id, date, prayer, record) marks in one transaction.
+        Returns {child_id: (before, after)} versions read inside it.
+        """
+        rows = [_record_to_row(*mark) for mark in marks]
+        child_ids = list(dict.fromkeys(row[0] for row in rows))
+        with self._connect(immediate=True) as conn:
+            before = {child_id: self._child_version(conn, child_id) for child_id in child_ids}
+            conn.executemany(UPSERT_MARK_SQL, rows)
+            conn.executemany(BUMP_VERSION_SQL, [(child_id,) for child_id in child_ids])
+            return {child_id: (before[child_id], self._child_version(conn, child_id)) for child_id in child_ids}
+
+    def delete_child_records(self, child_id):
+        """Removes all records of a child. Returns True if anything was deleted."""
+        with self._connect() as conn:
+            cursor = conn.execute('DELETE FROM prayer_records WHERE child_id = ?', (child_id,))
+            conn.execute(BUMP_VERSION_SQL, (child_id,))
+            return cursor.rowcount > 0
+
+    def compact(self):
+        """Checkpoints the SQLite write-ahead log into the main database file."""
+        with self._connect() as conn:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+# ----------------------------------------------------------------------
+# READ CACHE
+# ----------------------------------------------------------------------
+
+# Batches larger than this invalidate a child's cached views instead of patching them
+INCREMENTAL_MARKS_LIMIT = 50
+
+class CachedStorage:
+    """
+    Wraps a backend with the process-wide read cache. Loads are served from
+    memory until the underlying files change or a save goes through this
+    wrapper. Returned dicts are shared between sessions: do not mutate them.
+    A child's full history is cached in compact form (see compact_records.py),
+    a read-only mapping with the same shape as the nested dict.
+    """
+
+    def __init__(self, backend, namespace=None):
+        self.backend = backend
+        self.namespace = str(id(backend) if namespace is None else namespace)
+
+    def _group(self, name, child_id=None):
+        group = f'{self.namespace}:{name}'
+        return group if child_id is None else f'{group}:{child_id}'
+
+    def _cached(self, key, signature, loader):
+        return cache.get_or_load(key, signature, loader)
+
+    def _invalidate_child(self, child_id):
+        cache.invalidate(self._group('records', child_id))
+        cache.invalidate(self._group('records'))
+
+    def _invalidate_all(self):
+        cache.invalidate_namespace(self.namespace)
+
+    def load_user_data(self):
+        return self._cached((self._group('users'),), self.backend.signature('users'),
+                            self.backend.load_user_data)
+
+    def load_user_derived(self, name, build):
+        """Returns `build(user_data)` (e.g. an index of children by id), cached until the user data changes."""
+        return self._cached((self._group('users'), name), self.backend.signature('users'),
+                            lambda: build(self.load_user_data()))
+
+    def save_user_data(self, data):
+        try:
+            self.backend.save_user_data(data)
+        finally:
+            cache.invalidate(self._group('users'))
+
+    def update_user_data(self, mutator):
+        try:
+            return self.backend.update_user_data(mutator)
+        finally:
+            cache.invalidate(self._group('users'))
+
+    def load_prayer_records(self):
+        return self._cached((self._group('records'),), self.backend.signature('records'),
+                            self.backend.load_prayer_records)
+
+    def save_prayer_records(self, records):
+        try:
+            self.backend.save_prayer_records(records)
+        finally:
+            self._invalidate_all()
+
+    def update_prayer_records(self, mutator):
+        try:
+            return self.backend.update_prayer_records(mutator)
+        finally:
+            self._invalidate_all()
+
+    def load_child_records(self, child_id):
+        return self._cached((self._group('records', child_id),),
+                            self.backend.signature('records', child_id),
+                            lambda: compact_records.encode(self.backend.load_child_records(child_id)))
+
+    def has_records(self, child_id):
+        return self._cached((self._group('records', child_id), 'has_records'),
+                            self.backend.signature('records', child_id),
+                            lambda: self.backend.has_records(child_id))
+
+    def load_day_records(self, child_id, date_str):
+        if not self.backend.indexed_reads:
+            return self.load_child_records(child_id).get(date_str, {})
+        return self._cached((self._group('records', child_id), 'day', date_str),
+                            self.backend.signature('records', child_id),
+                            lambda: self.backend.load_day_records(child_id, date_str))
+
+    def get_records(self, child_id, start=None, end=None):
+        """
+        Returns one child's records with start <= date <= end. Indexed backends
+        query just that window; otherwise the window is cut from the cached
+        child records with a cached sorted date index.
+        """
+        start, end = date_bound(start), date_bound(end)
+        if not self.backend.indexed_reads:
+            child_records = self.load_child_records(child_id)
+            sorted_dates = self.load_child_derived(child_id, 'date_index', sorted)
+            return slice_dates(child_records, sorted_dates, start, end)
+        return self._cached((self._group('records', child_id), 'range', start, end),
+                            self.backend.signature('records', child_id),
+                            lambda: self.backend.get_records(child_id, start, end))
+
+    def get_records_many(self, child_ids, start=None, end=None):
+        """Returns the start..end window for several children as {child_id: records}."""
+        start, end = date_bound(start), date_bound(end)
+        if not self.backend.indexed_reads:
+            return {child_id: self.get_records(child_id, start, end) for child_id in child_ids}
+        return self._cached((self._group('records'), 'many', tuple(child_ids), start, end),
+                            self.backend.signature('records'),
+                            lambda: self.backend.get_records_many(child_ids, start, end))
+
+    def load_household_derived(self, child_ids, name, build, start=None, end=None):
+        """
+        Returns `build({child_id: records})` for several children's start..end
+        window, cached until any record in the household changes.
+        """
+        start, end = date_bound(start), date_bound(end)
+        return self._cached((self._group('records'), name, tuple(child_ids), start, end),
+                            self.backend.signature('records'),
+                            lambda: build(self.get_records_many(child_ids, start, end)))
+
+    def load_child_derived(self, child_id, name, build, start=None, end=None):
+        """
+        Returns `build(child_records)` cached under the child's current data
+        version, so derived views (frames, statistics) are rebuilt only after
+        that child's records change. With a start/end window only the records
+        in that window are passed to `build`.
+        """
+        key = (self._group('records', child_id), name)
+        if start is None and end is None:
+            loader = lambda: build(self.load_child_records(child_id))
+        else:
+            start, end = date_bound(start), date_bound(end)
+            key += (start, end)
+            loader = lambda: build(self.get_records(child_id, start, end))
+        return self._cached(key, self.backend.signature('records', child_id), loader)
+
+    def _peek_child(self, child_id):
+        """Returns the (signature, value) entry of the child's cached records."""
+        return cache.peek((self._group('records', child_id),))
+
+    def _apply_cached_marks(self, child_id, marks, before, after, cached_records):
+        """
+        Updates the child's cached records for freshly written marks, when
+        they were still current right before the write: each record is
+        swapped in place of a reload.
+        """
+        # Another writer got in first if the cached signature isn't the pre-write one
+        if cached_records is None or cached_records[0] != before:
+            return
+        if len(marks) > INCREMENTAL_MARKS_LIMIT:
+            return  # Cheaper to rebuild on the next read
+        is_compact = isinstance(cached_records[1], compact_records.CompactRecords)
+        if is_compact and not all(compact_records.is_date_key(mark[1]) for mark in marks):
+            return
+        child_records = cached_records[1].copy()
+        for _, date_str, prayer, record in marks:
+            if is_compact:
+                child_records.set_record(date_str, prayer, record)
+            else:
+                child_records[date_str] = dict(child_records.get(date_str, {}), **{prayer: record})
+        cache.put((self._group('records', child_id),), after, child_records)
+
+    def save_prayer_mark(self, child_id, date_str, prayer, record):
+        """Writes one mark, updating the cached records in place of a reload."""
+        cached = self._peek_child(child_id)
+        try:
+            before, after = self.backend.save_prayer_mark(child_id, date_str, prayer, record)
+        finally:
+            self._invalidate_child(child_id)
+        self._apply_cached_marks(child_id, [(child_id, date_str, prayer, record)], before, after, cached)
+
+    def save_prayer_marks(self, marks):
+        """Writes a batch of (child_id, date, prayer, record) marks through the backend in one go."""
+        marks_by_child = {}
+        for mark in marks:
+            marks_by_child.setdefault(mark[0], []).append(mark)
+        cached = {child_id: self._peek_child(child_id) for child_id in marks_by_child}
+        try:
+            signatures = self.backend.save_prayer_marks(
+                [mark for child_marks in marks_by_child.values() for mark in child_marks])
+        finally:
+            for child_id in marks_by_child:
+                self._invalidate_child(child_id)
+        for child_id, child_marks in marks_by_child.items():
+            self._apply_cached_marks(child_id, child_marks, *signatures[child_id], cached[child_id])
+        return signatures
+
+    def delete_child_records(self, child_id):
+        try:
+            return self.backend.delete_child_records(child_id)
+        finally:
+            self._invalidate_child(child_id)
+
+    def compact(self):
+        try:
+            self.backend.compact()
+        finally:
+            self._invalidate_all()
+
+# ----------------------------------------------------------------------
+# HOUSEHOLDS (TENANTS)
+# ----------------------------------------------------------------------
+# Every household has its own user file and records (a shard directory, or
+# a database with its own indexes), so loading one family's data never
+# reads another's. The original single-family files at the top level are
+# the DEFAULT_HOUSEHOLD; other households live under HOUSEHOLDS_DIR/<id>/
+# and are listed in HOUSEHOLDS_FILE:
+#
+#   {"version": 1, "households": {"<id>": {"name": ..., "created": ...}}}
+#
+# The household a rerun or API request works on is held in a context
+# variable, so get_storage() and everything built on it (services,
+# analytics, exports) is scoped to it without passing the id around.
+
+DEFAULT_HOUSEHOLD = 'default'
+
+_current_household = contextvars.ContextVar('namaz_household', default=DEFAULT_HOUSEHOLD)
+
+
+def current_household():
+    """Returns the id of the household the current rerun or request works on."""
+    return _current_household.get()
+
+
+def set_current_household(household_id):
+    """Scopes the rest of the current rerun (or thread) to a household."""
+    _current_household.set(household_id or DEFAULT_HOUSEHOLD)
+
+
+@contextmanager
+def household_scope(household_id):
+    """Scopes the body of a `with` block to a household."""
+    token = _current_household.set(household_id or DEFAULT_HOUSEHOLD)
+    try:
+        yield
+    finally:
+        _current_household.reset(token)
+
+
+def household_paths(household_id):
+    """Returns the user file, records directory, legacy records file, database and rollups file of a household."""
+    if household_id == DEFAULT_HOUSEHOLD:
+        return {"user_file": USER_FILE, "records_dir": PRAYER_RECORDS_DIR,
+                "legacy_records_file": PRAYER_RECORDS_FILE, "db_file": SQLITE_DB_FILE,
+                "rollups_file": ROLLUPS_FILE}
+    base = os.path.join(HOUSEHOLDS_DIR, shard_name(household_id))
+    return {"user_file": os.path.join(base, USER_FILE),
+            "records_dir": os.path.join(base, PRAYER_RECORDS_DIR),
+            "legacy_records_file": os.path.join(base, PRAYER_RECORDS_FILE),
+            "db_file": os.path.join(base, SQLITE_DB_FILE),
+            "rollups_file": os.path.join(base, ROLLUPS_FILE)}
+
+
+def _read_households(repair=True):
+    # A damaged registry is restored from its last-known-good copy, like the user files
+    document = load_document(HOUSEHOLDS_FILE, repair=repair)
+    households = document.get('households') if isinstance(document, dict) else None
+    return households if isinstance(households, dict) else {}
+
+
+def load_households():
+    """Returns the {household_id: {"name", "created"}} registry, cached until the file changes."""
+    return cache.get_or_load(('households',), cache.file_signature(HOUSEHOLDS_FILE),
+                             lambda: read_shared(HOUSEHOLDS_FILE, _read_households))
+
+
+def get_household(household_id):
+    """Returns a household's registry entry (a dict lookup), or None if there is no such household."""
+    if household_id == DEFAULT_HOUSEHOLD:
+        return {"name": "Default", "created": None}
+    return load_households().get(household_id)
+
+
+def create_household(name):
+    """Registers a new household with a fresh 8-character id and creates its directory. Returns the id."""
+    with file_lock(HOUSEHOLDS_FILE):
+        households = _read_households()
+        household_id = uuid.uuid4().hex[:8]
+        while household_id in households or household_id == DEFAULT_HOUSEHOLD:
+            household_id = uuid.uuid4().hex[:8]
+        os.makedirs(os.path.dirname(household_paths(household_id)['user_file']), exist_ok=True)
+        households[household_id] = {"name": name, "created": datetime.now().isoformat(timespec='seconds')}
+        atomic_write_json(HOUSEHOLDS_FILE, {"version": 1, "households": households}, backup=True)
+    cache.invalidate('households')
+    return household_id
+
+# ----------------------------------------------------------------------
+# BACKEND SELECTION AND MIGRATION
+# ----------------------------------------------------------------------
+
+_storages = {}  # household id -> CachedStorage
+_storages_lock = threading.Lock()
+
+
+def open_backend(household_id=DEFAULT_HOUSEHOLD):
+    """Returns an uncached backend, selected by NAMAZ_STORAGE, over a household's files."""
+    paths = household_paths(household_id)
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStorage(paths['db_file'])
+    if STORAGE_BACKEND == 'json':
+        return JsonStorage(paths['user_file'], paths['records_dir'], paths['legacy_records_file'])
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND!r}")
+
+
+def get_storage(household_id=None):
+    """
+    Returns the process-wide, read-cached storage of a household (by
+    default the current one). Raises ValueError for an unknown household.
+    """
+    household_id = household_id or current_household()
+    storage = _storages.get(household_id)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(household_id)
+            if storage is None:
+                if get_household(household_id) is None:
+                    raise ValueError(f"Unknown household: {household_id!r}")
+                storage = _storages[household_id] = CachedStorage(open_backend(household_id), household_id)
+    return storage
+
+
+def migrate_json_to_sqlite(user_file=USER_FILE, records_dir=PRAYER_RECORDS_DIR,
+                           db_file=SQLITE_DB_FILE, legacy_records_file=PRAYER_RECORDS_FILE):
+    """
+    Copies the users and prayer records from the JSON files into the SQLite
+    database, replacing whatever the database held. Returns (children, marks) counts.
+    """
+    source = JsonStorage(user_file, records_dir, legacy_records_file)
+    target = SqliteStorage(db_file)
+
+    user_data = source.load_user_data()
+    records = source.load_prayer_records()
+
+    target.save_user_data(user_data)
+    target.save_prayer_records(records)
+
+    marks = sum(len(daily) for child in records.values() for daily in child.values())
+    return len(user_data.get('children', [])), marks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Namaz Tracker storage tools.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = subparsers.add_parser('migrate', help='Copy the JSON files into SQLite.')
+    migrate_parser.add_argument('--users', default=USER_FILE)
+    migrate_parser.add_argument('--records-dir', default=PRAYER_RECORDS_DIR)
+    migrate_parser.add_argument('--db', default=SQLITE_DB_FILE)
+
+    compact_parser = subparsers.add_parser('compact', help='Fold the mark logs into the records snapshots.')
+    compact_parser.add_argument('--household', default=DEFAULT_HOUSEHOLD)
+
+    args = parser.parse_args()
+    if args.command == 'compact':
+        get_storage(args.household).compact()
+        print("Mark logs compacted.")
+    elif args.command == 'migrate':
+        children, marks = migrate_json_to_sqlite(args.users, args.records_dir, args.db)
+        print(f"Migrated {children} children and {marks} prayer marks into {args.db}.")
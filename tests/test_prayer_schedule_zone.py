@@ -0,0 +1,90 @@
+"""
+Prayer due times, overdue flags and reminders follow the schedule's time
+zone (NAMAZ_TIMEZONE), not the server's: the server is pinned to UTC and
+the schedule to Asia/Karachi (UTC+5, no DST).
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ['NAMAZ_TIMEZONE'] = 'Asia/Karachi'
+os.environ['NAMAZ_LATITUDE'] = '24.8607'
+os.environ['NAMAZ_LONGITUDE'] = '67.0011'
+
+import services
+import reminders
+import prayer_times
+
+DAY = date(2025, 6, 1)
+KARACHI = timedelta(hours=5)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def utc_server(tmp_path_factory):
+    """Runs the module on a UTC 'server' with its data in a temp directory."""
+    saved_tz, saved_cwd = os.environ.get('TZ'), os.getcwd()
+    os.environ['TZ'] = 'UTC'
+    time.tzset()
+    os.chdir(tmp_path_factory.mktemp('household'))
+    yield
+    os.chdir(saved_cwd)
+    if saved_tz is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = saved_tz
+    time.tzset()
+
+
+@pytest.fixture(scope='module')
+def child():
+    return services.add_child('Umar', 'secret')
+
+
+def fajr_due():
+    return dict(services.prayer_due_times(DAY))['Fajr']
+
+
+def test_due_times_are_aware_in_schedule_zone():
+    due = fajr_due()
+    assert due.utcoffset() == KARACHI
+    minutes = prayer_times.get_prayer_minutes(DAY)['Fajr'] + services.REMINDER_GRACE_MINUTES
+    assert (due.hour, due.minute) == divmod(minutes, 60)
+
+
+def test_overdue_compares_instants_not_wall_clocks(child):
+    due_utc = fajr_due().astimezone(timezone.utc)
+    assert 'Fajr' not in services.overdue_prayers(child['id'], due_utc - timedelta(minutes=1))
+    assert 'Fajr' in services.overdue_prayers(child['id'], due_utc + timedelta(minutes=1))
+    # Fajr is due on the evening before in UTC; the schedule's day is still June 1
+    assert due_utc.date() == DAY - timedelta(days=1)
+    # A naive reading is wall-clock time in the schedule's zone, not the server's
+    local_wall_clock = fajr_due().replace(tzinfo=None)
+    assert 'Fajr' not in services.overdue_prayers(child['id'], local_wall_clock - timedelta(minutes=1))
+    assert 'Fajr' in services.overdue_prayers(child['id'], local_wall_clock + timedelta(minutes=1))
+
+
+def test_schedule_day_follows_schedule_zone():
+    late_utc = datetime(2025, 6, 1, 22, 0, tzinfo=timezone.utc)  # 03:00 on June 2 in Karachi
+    assert prayer_times.in_schedule_zone(late_utc).date() == date(2025, 6, 2)
+
+
+def test_reminder_engine_with_utc_clock(child, tmp_path):
+    log = tmp_path / 'reminders.log'
+    due_utc = fajr_due().astimezone(timezone.utc)
+    now = [datetime.combine(DAY, datetime.min.time(), timezone.utc) - KARACHI]  # local midnight
+    engine = reminders.ReminderEngine(reminders.LogNotifier(str(log)), clock=lambda: now[0])
+    engine.refresh_roster()
+
+    assert engine.run_pending(due_utc - timedelta(minutes=1)) == 0
+    assert engine.run_pending(due_utc) == 1
+    sent = [services.storage.schema.loads(line) for line in log.read_text().splitlines()]
+    assert [(r['prayer'], r['date'], r['due']) for r in sent] == [
+        ('Fajr', str(DAY), fajr_due().isoformat(timespec='minutes'))]